@@ -0,0 +1,90 @@
+#!python3
+
+import math
+from array import array
+
+class FuelEstimator:
+    # fuel level is sampled when player car crosses start/finish line, usage and time of last laps
+    # are kept in fixed size ring with running sums, so estimate is cheap to read every tick
+    def __init__(self, window=5):
+        self.window = max(1, window)
+        self.reset()
+
+    def reset(self):
+        self.usages = array('d', [0]) * self.window
+        self.times = array('d', [0]) * self.window
+        self.head = 0
+        self.count = 0
+        self.usage_sum = 0
+        self.time_sum = 0
+        # fuel, lap and time at last line crossing, lap -1 - not sampled yet, fuel -1 - unknown
+        self.start_fuel = -1
+        self.start_lap = -1
+        self.start_time = -1
+        self.last_fuel = -1
+        # pit road or refuel since last crossing, lap is not counted
+        self.pitted = False
+
+    def update(self, lap, fuel, on_pit_road, session_time):
+        if lap is None or fuel is None or lap < 1:
+            return
+        if on_pit_road or (self.last_fuel != -1 and fuel > self.last_fuel):
+            self.pitted = True
+        self.last_fuel = fuel
+        if lap == self.start_lap:
+            return
+
+        if lap == self.start_lap + 1 and self.start_fuel != -1 and not self.pitted:
+            usage = self.start_fuel - fuel
+            if usage > 0:
+                self.add(usage, session_time - self.start_time)
+        # else tow, reset or skipped laps after reconnect
+
+        # first sample is somewhere in middle of lap, so that lap is not counted
+        self.start_fuel = fuel if self.start_lap != -1 else -1
+        self.start_lap = lap
+        self.start_time = session_time
+        self.pitted = bool(on_pit_road)
+
+    def add(self, usage, lap_time):
+        head = self.head
+        if self.count == self.window:
+            self.usage_sum -= self.usages[head]
+            self.time_sum -= self.times[head]
+        else:
+            self.count += 1
+        self.usages[head] = usage
+        self.times[head] = lap_time
+        self.usage_sum += usage
+        self.time_sum += lap_time
+        self.head = (head + 1) % self.window
+
+    def per_lap(self):
+        # average fuel usage per lap, -1 if there are no laps yet
+        return self.usage_sum / self.count if self.count else -1
+
+    def lap_time(self):
+        return self.time_sum / self.count if self.count else -1
+
+    def laps_remaining(self, fuel):
+        per_lap = self.per_lap()
+        return fuel / per_lap if per_lap > 0 else -1
+
+    def laps_to_go(self, lap, lap_dist_pct, session_laps=-1, time_left=-1):
+        # laps left in session from current position, by lap count or by time left, -1 unknown
+        if lap is None or lap < 1 or lap_dist_pct is None or lap_dist_pct < 0:
+            return -1
+        if session_laps > 0:
+            return max(0, session_laps - (lap - 1) - lap_dist_pct)
+        lap_time = self.lap_time()
+        if time_left < 0 or lap_time <= 0:
+            return -1
+        # lap in progress when time runs out is finished too
+        return math.ceil(lap_dist_pct + time_left / lap_time) - lap_dist_pct
+
+    def fuel_to_finish(self, fuel, laps_to_go):
+        # fuel to add to reach end of session, -1 unknown
+        per_lap = self.per_lap()
+        if per_lap <= 0 or laps_to_go < 0:
+            return -1
+        return max(0, laps_to_go * per_lap - fuel)
@@ -0,0 +1,65 @@
+#!python3
+
+from array import array
+
+class GapTracker:
+    # every lap is split into checkpoints, crossing time is stored for last lap of checkpoints for every car
+    # gap between two cars is difference of times when they crossed same checkpoint
+    def __init__(self, checkpoints=100, cars=64):
+        self.checkpoints = checkpoints
+        self.cars = cars
+        self.reset()
+
+    def reset(self):
+        size = self.cars * self.checkpoints
+        self.times = array('d', [-1]) * size
+        # absolute checkpoint number (lap * checkpoints + index) stored in slot
+        self.numbers = array('l', [-1]) * size
+        self.last_numbers = array('l', [-1]) * self.cars
+        self.last_pos = array('d', [-1]) * self.cars
+        self.last_time = array('d', [-1]) * self.cars
+
+    def update(self, laps, lap_dist_pcts, session_time):
+        n = self.checkpoints
+        times, numbers = self.times, self.numbers
+        last_numbers, last_pos, last_time = self.last_numbers, self.last_pos, self.last_time
+        for car_idx in range(min(self.cars, len(lap_dist_pcts))):
+            pct = lap_dist_pcts[car_idx]
+            lap = laps[car_idx]
+            if pct < 0 or lap < 0:
+                last_numbers[car_idx] = -1
+                continue
+            pos = (lap + pct) * n
+            number = int(pos)
+            last_number = last_numbers[car_idx]
+            if number == last_number:
+                continue
+
+            if last_number != -1 and 0 < number - last_number <= n // 2:
+                # interpolate crossing time of every passed checkpoint
+                base = car_idx * n
+                prev_pos = last_pos[car_idx]
+                prev_time = last_time[car_idx]
+                time_per_pos = (session_time - prev_time) / (pos - prev_pos)
+                for c in range(last_number + 1, number + 1):
+                    slot = base + c % n
+                    times[slot] = prev_time + (c - prev_pos) * time_per_pos
+                    numbers[slot] = c
+            # else first sample, tow, reset or lap/pct glitch around start/finish line,
+            # just start tracking from current position
+
+            last_numbers[car_idx] = number
+            last_pos[car_idx] = pos
+            last_time[car_idx] = session_time
+
+    def gap(self, car_idx, ref_car_idx):
+        # seconds car_idx is behind ref_car_idx, None if ref car is more than lap ahead or behind
+        number = self.last_numbers[car_idx]
+        if number == -1:
+            return None
+        n = self.checkpoints
+        slot = number % n
+        ref_slot = ref_car_idx * n + slot
+        if self.numbers[ref_slot] != number:
+            return None
+        return max(0, self.times[car_idx * n + slot] - self.times[ref_slot])
@@ -0,0 +1,81 @@
+#!python3
+
+import math
+from array import array
+
+class LapHistory:
+    # last laps of every car in flat arrays, statistics are updated on every lap without rescanning history
+    def __init__(self, cars=64, window=5):
+        self.cars = cars
+        self.window = max(1, window)
+        self.reset()
+
+    def reset(self):
+        cars = self.cars
+        self.times = array('d', [0]) * (cars * self.window)
+        self.heads = array('l', [0]) * cars
+        self.counts = array('l', [0]) * cars
+        self.sums = array('d', [0]) * cars
+        self.squares = array('d', [0]) * cars
+        self.best = array('d', [-1]) * cars
+        # stint mean and variance, welford's method
+        self.stint_laps = array('l', [0]) * cars
+        self.stint_means = array('d', [0]) * cars
+        self.stint_m2 = array('d', [0]) * cars
+        # car was on pit road since last recorded lap
+        self.pitted = array('b', [0]) * cars
+
+    def mark_pits(self, on_pit_road):
+        pitted = self.pitted
+        for car_idx, on_pit in zip(range(self.cars), on_pit_road):
+            if on_pit:
+                pitted[car_idx] = 1
+
+    def add(self, car_idx, lap_time):
+        if lap_time <= 0:
+            return
+        if self.pitted[car_idx]:
+            # in and out laps start new stint and are not counted
+            self.pitted[car_idx] = 0
+            self.stint_laps[car_idx] = 0
+            self.stint_means[car_idx] = self.stint_m2[car_idx] = 0
+            return
+
+        slot = car_idx * self.window + self.heads[car_idx]
+        if self.counts[car_idx] == self.window:
+            old = self.times[slot]
+            self.sums[car_idx] -= old
+            self.squares[car_idx] -= old * old
+        else:
+            self.counts[car_idx] += 1
+        self.times[slot] = lap_time
+        self.sums[car_idx] += lap_time
+        self.squares[car_idx] += lap_time * lap_time
+        self.heads[car_idx] = (self.heads[car_idx] + 1) % self.window
+
+        if self.best[car_idx] == -1 or lap_time < self.best[car_idx]:
+            self.best[car_idx] = lap_time
+
+        n = self.stint_laps[car_idx] = self.stint_laps[car_idx] + 1
+        delta = lap_time - self.stint_means[car_idx]
+        self.stint_means[car_idx] += delta / n
+        self.stint_m2[car_idx] += delta * (lap_time - self.stint_means[car_idx])
+
+    def average(self, car_idx):
+        # average of last laps in window, -1 if there are none
+        n = self.counts[car_idx]
+        return self.sums[car_idx] / n if n else -1
+
+    def consistency(self, car_idx):
+        # standard deviation of last laps in window, -1 if there are less than 2
+        n = self.counts[car_idx]
+        if n < 2:
+            return -1
+        return math.sqrt(max(0, (self.squares[car_idx] - self.sums[car_idx] ** 2 / n) / (n - 1)))
+
+    def stint(self, car_idx):
+        # (laps, average, standard deviation) of current stint
+        n = self.stint_laps[car_idx]
+        if not n:
+            return 0, -1, -1
+        return n, self.stint_means[car_idx], math.sqrt(self.stint_m2[car_idx] / (n - 1)) if n > 1 else -1
@@ -0,0 +1,153 @@
+#!python3
+
+import os
+import time
+import hashlib
+import logging
+import threading
+
+class OutputFile:
+    def __init__(self, path):
+        self.path = path
+        self.tmp_path = path + '.tmp'
+        self.digest = None
+        self.writes = 0
+        self.skips = 0
+        self.coalesced = 0
+
+def write_file(f, data):
+    try:
+        with open(f.tmp_path, 'wb') as tmp:
+            tmp.write(data)
+        try:
+            os.replace(f.tmp_path, f.path)
+        except PermissionError:
+            # on windows reader may keep file locked, fallback to in place write
+            with open(f.path, 'wb') as out:
+                out.write(data)
+            os.remove(f.tmp_path)
+    except OSError:
+        # don't leave temp file behind
+        try:
+            os.remove(f.tmp_path)
+        except OSError:
+            pass
+        raise
+
+class BackgroundWriter:
+    # writes files in own thread, if file is changed again before previous text is written, only latest is kept
+    def __init__(self):
+        self.pending = {}
+        self.max_depth = 0
+        self.coalesced = 0
+        import stats
+        self.latency = stats.Histogram()
+        self._cond = threading.Condition()
+        self._stopped = False
+        self.thread = threading.Thread(target=self._run, name='output-writer', daemon=True)
+        self.thread.start()
+
+    def put(self, f, data):
+        with self._cond:
+            if f in self.pending:
+                self.coalesced += 1
+                f.coalesced += 1
+            self.pending[f] = (data, time.perf_counter())
+            self.max_depth = max(self.max_depth, len(self.pending))
+            self._cond.notify()
+
+    def depth(self):
+        return len(self.pending)
+
+    def stop(self, timeout=5):
+        # pending files are written before thread exits
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        self.thread.join(timeout)
+
+    def summary(self):
+        return 'queue depth {} (max {}), {} coalesced, latency: {}'.format(
+            self.depth(), self.max_depth, self.coalesced, self.latency.summary())
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._stopped or self.pending)
+                if not self.pending:
+                    break
+                pending, self.pending = self.pending, {}
+            for f, (data, queued) in pending.items():
+                try:
+                    write_file(f, data)
+                except OSError as e:
+                    logging.error('output writer: %s', e)
+                    with self._cond:
+                        # same text is written again on next write, unless newer one is already queued
+                        if f not in self.pending:
+                            f.digest = None
+                    continue
+                f.writes += 1
+                self.latency.add(time.perf_counter() - queued)
+
+class OutputSink:
+    def __init__(self, directory='.', write_files=True, background=False):
+        self.directory = directory
+        self.write_files = write_files
+        self.files = {}
+        # called with (name, text) on every change
+        self.listeners = []
+        self.writer = BackgroundWriter() if write_files and background else None
+
+    def add(self, name, filename):
+        self.files[name] = OutputFile(os.path.join(self.directory, filename))
+        self.write(name, '', force=True)
+
+    def write(self, name, text, force=False):
+        f = self.files[name]
+        data = text.encode('utf-8')
+        digest = hashlib.sha1(data).digest()
+        if digest == f.digest and not force:
+            f.skips += 1
+            return False
+
+        if self.writer:
+            # digest is set before file is queued, so writer could clear it when write fails,
+            # write is counted when it is done
+            f.digest = digest
+            self.writer.put(f, data)
+        else:
+            if self.write_files:
+                try:
+                    write_file(f, data)
+                except OSError as e:
+                    # file locked by reader or antivirus, digest is not updated, so it is written again next time
+                    logging.error('output: %s', e)
+                    return False
+            f.digest = digest
+            f.writes += 1
+        for listener in self.listeners:
+            listener(name, text)
+        return True
+
+    def clear(self, *names):
+        for name in names or self.files:
+            self.write(name, '')
+
+    def remove(self, *names):
+        for name in names:
+            self.write(name, '')
+            del self.files[name]
+
+    def counts(self):
+        return {name: (f.writes, f.skips, f.coalesced) for name, f in self.files.items()}
+
+    def close(self):
+        if self.writer:
+            self.writer.stop()
+
+    def log_counts(self):
+        for name, (writes, skips, coalesced) in sorted(self.counts().items()):
+            logging.info('%s: %d writes, %d skipped, %d coalesced', name, writes, skips, coalesced)
+        if self.writer:
+            logging.info('output writer: %s', self.writer.summary())
@@ -0,0 +1,120 @@
+#!python3
+
+import gzip
+import json
+import struct
+import logging
+
+import telemetry
+
+FORMAT_VERSION = 2
+MAGIC = 'ir-text-overlay recording'
+
+# variables used by overlay, recorded by default
+RECORD_VARS = [
+    'SessionTime', 'SessionNum', 'SessionState', 'SessionFlags', 'CamCarIdx',
+    'IsReplayPlaying', 'ReplayFrameNumEnd',
+    'Speed', 'RPM', 'Gear', 'FuelLevel', 'Lap', 'LapDistPct', 'OnPitRoad',
+    'CarIdxTrackSurface', 'CarIdxLapDistPct', 'CarIdxLap', 'CarIdxRPM', 'CarIdxGear', 'CarIdxOnPitRoad',
+]
+
+# container is gzip stream of records, every record is uint32 little endian length and utf-8 json,
+# recordings are shared between users, so format is data only
+#   header: [MAGIC, FORMAT_VERSION, var names]
+#   tick:   [changed vars as {name: value}, session info as {key: value} or null]
+# only variables changed since previous tick are stored
+
+LENGTH = struct.Struct('<I')
+# biggest record, session info of full field is well below
+MAX_RECORD = 64 * 1024 * 1024
+
+def write_record(f, record):
+    data = json.dumps(record, separators=(',', ':'), default=str).encode('utf-8')
+    f.write(LENGTH.pack(len(data)))
+    f.write(data)
+
+def read_record(f):
+    # EOFError at end of file, ValueError if record is cut or broken
+    prefix = f.read(LENGTH.size)
+    if not prefix:
+        raise EOFError
+    if len(prefix) < LENGTH.size:
+        raise ValueError('truncated record')
+    length, = LENGTH.unpack(prefix)
+    if length > MAX_RECORD:
+        raise ValueError('record is too big: %d bytes' % length)
+    data = f.read(length)
+    if len(data) < length:
+        raise ValueError('truncated record')
+    return json.loads(data.decode('utf-8'))
+
+def is_recording(path):
+    try:
+        with gzip.open(path, 'rb') as f:
+            header = read_record(f)
+        return isinstance(header, list) and len(header) == 3 and header[0] == MAGIC
+    except (OSError, EOFError, ValueError):
+        return False
+
+class Recorder:
+    def __init__(self, path, var_names=None, compresslevel=1):
+        self.path = path
+        self.var_names = list(var_names or RECORD_VARS)
+        self.file = gzip.open(path, 'wb', compresslevel=compresslevel)
+        self.last_values = {}
+        self.ticks = 0
+        write_record(self.file, (MAGIC, FORMAT_VERSION, self.var_names))
+
+    def record(self, tick, session_info=None):
+        changed = {}
+        last_values = self.last_values
+        for name in self.var_names:
+            value = tick[name]
+            if name not in last_values or last_values[name] != value:
+                changed[name] = last_values[name] = value
+        write_record(self.file, (changed, session_info))
+        self.ticks += 1
+
+    def close(self):
+        self.file.close()
+        logging.info('recorded %d ticks to %s', self.ticks, self.path)
+
+class RecordingReader:
+    # acts like irsdk.IRSDK, replays recorded ticks one by one with frames()
+    def __init__(self, path):
+        self.path = path
+        self.values = {}
+        self.session_info_update = 0
+        self.is_initialized = self.is_connected = False
+
+    def startup(self, test_file=None, dump_to=None):
+        return self.is_initialized
+
+    def shutdown(self):
+        pass
+
+    def frames(self):
+        with gzip.open(self.path, 'rb') as f:
+            magic, version, self.var_names = read_record(f)
+            if magic != MAGIC or version > FORMAT_VERSION:
+                raise ValueError('unsupported recording %s' % self.path)
+            self.values = dict.fromkeys(telemetry.SESSION_INFO_KEYS)
+            self.is_initialized = self.is_connected = True
+            while True:
+                try:
+                    changed, session_info = read_record(f)
+                except EOFError:
+                    break
+                except (OSError, ValueError):
+                    # recording could be cut, when app was killed
+                    logging.warning('recording %s is truncated', self.path)
+                    break
+                self.values.update(changed)
+                if session_info is not None:
+                    self.values.update(session_info)
+                    self.session_info_update += 1
+                yield self
+        self.is_initialized = self.is_connected = False
+
+    def __getitem__(self, key):
+        return self.values.get(key)
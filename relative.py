@@ -0,0 +1,18 @@
+#!python3
+
+NOT_IN_WORLD = -1
+
+def wrap_lap_distance(diff):
+    if diff < -.5:
+        return diff + 1
+    elif diff > .5:
+        return diff - 1
+    return diff
+
+def relative_order(lap_dist_pcts, track_surfaces, cam_car_idx, car_idxs):
+    # returns car indexes ordered from ahead to behind of cam car, and cam car index in that list
+    cam_pct = lap_dist_pcts[cam_car_idx]
+    cars = [car_idx for car_idx in car_idxs
+        if lap_dist_pcts[car_idx] != -1 and track_surfaces[car_idx] != NOT_IN_WORLD]
+    cars.sort(reverse=True, key=lambda car_idx: wrap_lap_distance(lap_dist_pcts[car_idx] - cam_pct))
+    return cars, cars.index(cam_car_idx) if cam_car_idx in cars else -1
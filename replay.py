@@ -0,0 +1,114 @@
+#!python3
+
+import os
+import re
+import time
+import logging
+import zipfile
+import tempfile
+import contextlib
+
+import recorder
+
+def natural_key(name):
+    return [int(part) if part.isdigit() else part for part in re.split(r'(\d+)', name)]
+
+@contextlib.contextmanager
+def frame_files(path):
+    # directory or zip archive of irsdk mmap dumps, or single dump
+    if os.path.isdir(path):
+        yield [os.path.join(path, f) for f in sorted(os.listdir(path), key=natural_key)
+            if os.path.isfile(os.path.join(path, f))]
+    elif zipfile.is_zipfile(path):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with zipfile.ZipFile(path) as zf:
+                names = sorted((n for n in zf.namelist() if not n.endswith('/')), key=natural_key)
+                zf.extractall(tmp_dir, names)
+            yield [os.path.join(tmp_dir, n) for n in names]
+    else:
+        yield [path]
+
+class Latency:
+    def __init__(self):
+        self.samples = []
+
+    def add(self, value):
+        self.samples.append(value)
+
+    def summary(self):
+        if not self.samples:
+            return 'no samples'
+        samples = sorted(self.samples)
+        pct = lambda p: samples[min(len(samples) - 1, int(len(samples) * p))] * 1000
+        return '{} calls, avg {:.3f}ms, p50 {:.3f}ms, p95 {:.3f}ms, max {:.3f}ms'.format(
+            len(samples), sum(samples) / len(samples) * 1000, pct(.5), pct(.95), samples[-1] * 1000)
+
+def timed(func, latency):
+    def wrapper():
+        start = time.perf_counter()
+        try:
+            return func()
+        finally:
+            latency.add(time.perf_counter() - start)
+    return wrapper
+
+def dump_frames(ir, files):
+    for f in files:
+        ir.shutdown()
+        ir.startup(test_file=f)
+        yield ir
+
+@contextlib.contextmanager
+def open_frames(ir, path):
+    if recorder.is_recording(path):
+        yield ir.frames()
+    else:
+        with frame_files(path) as files:
+            yield dump_frames(ir, files)
+
+def run(ir, tick_func, widgets, sink, path, speed=0):
+    # speed: 1 - recorded speed, 2 - twice faster, 0 - as fast as possible
+    widget_latency = {}
+    for task in widgets.tasks:
+        widget_latency[task.name] = Latency()
+        task.func = timed(task.func, widget_latency[task.name])
+    load_latency = Latency()
+    tick_latency = Latency()
+    last_outputs = {}
+    sink.listeners.append(last_outputs.__setitem__)
+
+    logging.info('replay %s', path)
+    with open_frames(ir, path) as frames:
+        start = time.perf_counter()
+        first_session_time = None
+        ticks = 0
+        while True:
+            load_start = time.perf_counter()
+            if next(frames, None) is None:
+                break
+            load_latency.add(time.perf_counter() - load_start)
+
+            if speed > 0:
+                session_time = ir['SessionTime']
+                if first_session_time is None:
+                    first_session_time = session_time
+                    replay_start = time.perf_counter()
+                delay = replay_start + (session_time - first_session_time) / speed - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+
+            tick_start = time.perf_counter()
+            tick_func()
+            tick_latency.add(time.perf_counter() - tick_start)
+            ticks += 1
+        elapsed = time.perf_counter() - start
+
+    busy = sum(tick_latency.samples)
+    logging.info('replay done: %d ticks in %.3fs, %.1f ticks/sec (%.1f ticks/sec pipeline only)',
+        ticks, elapsed, ticks / elapsed if elapsed else 0, ticks / busy if busy else 0)
+    logging.info('load: %s', load_latency.summary())
+    logging.info('tick: %s', tick_latency.summary())
+    for name, latency in widget_latency.items():
+        logging.info('%s: %s', name, latency.summary())
+    for name, text in sorted(last_outputs.items()):
+        logging.info('%s:\n%s', name, text)
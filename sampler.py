@@ -0,0 +1,253 @@
+#!python3
+
+import os
+import sys
+import time
+import struct
+import pickle
+import logging
+import subprocess
+import irsdk
+
+import shm
+import telemetry
+import recorder
+
+# frame ring in shared memory, written by sampler process, read by renderer processes
+#
+# header, 64 bytes
+#   0  char[4]   magic 'IRTF'
+#   4  uint16    version
+#   6  uint16    reserved
+#   8  uint32    slots
+#   12 uint32    slot size
+#   16 uint64    frames written
+#   24 uint32    sim connected
+#   28 uint32    sampler pid
+#   32 double    sampler heartbeat, time.time()
+#   40 double    main renderer heartbeat, time.time(), other processes exit when it stops
+#
+# slot
+#   0  uint64    sequence, frame number * 2 + 1 while writing, frame number * 2 + 2 when done
+#   8  uint32    data length
+#   12 uint32    reserved
+#   16           pickled frame ({var name: value}, None), same host only
+#
+# every frame has all recorded variables, so reader could skip to latest one
+
+MAGIC = b'IRTF'
+VERSION = 2
+
+SLOTS = 16
+SLOT_SIZE = 64 * 1024
+
+HEADER = struct.Struct('<4sHHII')
+HEADER_SIZE = 64
+FRAMES = struct.Struct('<Q')
+FRAMES_OFFSET = 16
+CONNECTED = struct.Struct('<II')
+CONNECTED_OFFSET = 24
+HEARTBEAT = struct.Struct('<d')
+HEARTBEAT_OFFSET = 32
+PARENT_HEARTBEAT_OFFSET = 40
+SLOT_HEADER = struct.Struct('<QI4x')
+
+SIZE = HEADER_SIZE + SLOTS * SLOT_SIZE
+
+# sampler is treated as dead when heartbeat is older
+HEARTBEAT_TIMEOUT = 5
+# main renderer could be busy longer, with session info parsing or settings reload
+PARENT_TIMEOUT = 10
+
+class FrameRing:
+    def __init__(self, name, create=False, write=False):
+        self.name = name
+        self.mm = shm.open_mapping(name, create, SIZE, write)
+        self.frames = 0
+        self.retries = 0
+        self.frames_field = shm.field(self.mm, FRAMES_OFFSET, 'Q')
+        self.connected_field = shm.field(self.mm, CONNECTED_OFFSET, 'I')
+        self.pid_field = shm.field(self.mm, CONNECTED_OFFSET + 4, 'I')
+        self.heartbeat_field = shm.field(self.mm, HEARTBEAT_OFFSET, 'd')
+        self.parent_heartbeat_field = shm.field(self.mm, PARENT_HEARTBEAT_OFFSET, 'd')
+        if create:
+            HEADER.pack_into(self.mm, 0, MAGIC, VERSION, 0, SLOTS, SLOT_SIZE)
+            FRAMES.pack_into(self.mm, FRAMES_OFFSET, 0)
+            CONNECTED.pack_into(self.mm, CONNECTED_OFFSET, 0, 0)
+            HEARTBEAT.pack_into(self.mm, HEARTBEAT_OFFSET, 0)
+            HEARTBEAT.pack_into(self.mm, PARENT_HEARTBEAT_OFFSET, time.time())
+        elif write:
+            self.frames, = FRAMES.unpack_from(self.mm, FRAMES_OFFSET)
+
+    def put(self, frame):
+        data = pickle.dumps(frame, pickle.HIGHEST_PROTOCOL)
+        if len(data) > SLOT_SIZE - SLOT_HEADER.size:
+            logging.error('frame is too big for ring slot: %d bytes', len(data))
+            return False
+        number = self.frames
+        offset = HEADER_SIZE + number % SLOTS * SLOT_SIZE
+        SLOT_HEADER.pack_into(self.mm, offset, number * 2 + 1, len(data))
+        start = offset + SLOT_HEADER.size
+        self.mm[start:start + len(data)] = data
+        SLOT_HEADER.pack_into(self.mm, offset, number * 2 + 2, len(data))
+        self.frames = number + 1
+        self.frames_field[0] = self.frames
+        return True
+
+    def set_connected(self, connected):
+        # pid first, connected flag is single store
+        self.pid_field[0] = os.getpid()
+        self.connected_field[0] = int(connected)
+
+    def heartbeat(self):
+        self.heartbeat_field[0] = time.time()
+
+    def parent_heartbeat(self):
+        self.parent_heartbeat_field[0] = time.time()
+
+    def is_parent_alive(self):
+        return time.time() - self.parent_heartbeat_field[0] < PARENT_TIMEOUT
+
+    def frame_count(self):
+        return FRAMES.unpack_from(self.mm, FRAMES_OFFSET)[0]
+
+    def is_connected(self):
+        connected, _ = CONNECTED.unpack_from(self.mm, CONNECTED_OFFSET)
+        heartbeat, = HEARTBEAT.unpack_from(self.mm, HEARTBEAT_OFFSET)
+        return bool(connected) and time.time() - heartbeat < HEARTBEAT_TIMEOUT
+
+    def latest(self):
+        # returns (frames written, latest frame), frame is None if nothing was written yet
+        while True:
+            frames = self.frame_count()
+            if not frames:
+                return 0, None
+            number = frames - 1
+            offset = HEADER_SIZE + number % SLOTS * SLOT_SIZE
+            sequence, length = SLOT_HEADER.unpack_from(self.mm, offset)
+            if sequence == number * 2 + 2:
+                start = offset + SLOT_HEADER.size
+                data = self.mm[start:start + length]
+                if SLOT_HEADER.unpack_from(self.mm, offset)[0] == sequence:
+                    return frames, pickle.loads(data)
+            # slot was overwritten by writer, try newer one
+            self.retries += 1
+
+    def close(self):
+        for view in (self.frames_field, self.connected_field, self.pid_field, self.heartbeat_field,
+                self.parent_heartbeat_field):
+            view.release()
+        self.mm.close()
+
+    def remove(self):
+        self.close()
+        shm.remove_mapping(self.name)
+
+class SharedSource:
+    # acts like irsdk.IRSDK, telemetry comes from sampler process,
+    # session info is read directly from sim, it is parsed only in renderer process
+    def __init__(self, name):
+        self.ring = FrameRing(name)
+        self.ir = irsdk.IRSDK()
+        self.values = {}
+        self.frame = 0
+        self.var_headers_names = list(recorder.RECORD_VARS)
+
+    @property
+    def is_initialized(self):
+        return self.ring.is_connected() and self.ir.is_initialized
+
+    @property
+    def is_connected(self):
+        return self.ring.is_connected() and self.ir.is_connected
+
+    @property
+    def session_info_update(self):
+        header = getattr(self.ir, '_header', None)
+        return getattr(header, 'session_info_update', None)
+
+    def startup(self, test_file=None, dump_to=None):
+        return self.ring.is_connected() and self.ir.startup()
+
+    def shutdown(self):
+        self.ir.shutdown()
+        self.values = {}
+
+    def tick_count(self):
+        return self.ring.frame_count()
+
+    def freeze_var_buffer_latest(self):
+        frames, frame = self.ring.latest()
+        if frame and frames != self.frame:
+            self.frame = frames
+            self.values.update(frame[0])
+
+    def unfreeze_var_buffer_latest(self):
+        pass
+
+    def __getitem__(self, key):
+        if key in telemetry.SESSION_INFO_KEYS:
+            return self.ir[key]
+        return self.values.get(key)
+
+def run(name, max_rate=60, reconnect_max=1):
+    # sampler process, reads only telemetry variables, never blocked by rendering
+    ring = FrameRing(name, write=True)
+    ir = irsdk.IRSDK()
+    waiter = telemetry.TickWaiter(ir, max_rate)
+    var_names = recorder.RECORD_VARS
+    connected = False
+    ring_connected = False
+    reconnect_delay = .05
+    logging.info('sampler started, pid %d', os.getpid())
+    try:
+        while True:
+            ring.heartbeat()
+            # parent could be killed without cleanup, don't stay attached to sim
+            if not ring.is_parent_alive():
+                logging.info('sampler: main process is gone, exiting')
+                # main process could not remove ring, renderers keep their mapping after it is removed
+                ring.remove()
+                break
+            if connected and (not ir.is_initialized or not ir.is_connected):
+                connected = ring_connected = False
+                ir.shutdown()
+                ring.set_connected(False)
+                logging.info('sampler: IRSDK disconnected')
+            elif not connected and (ir.is_initialized or ir.is_connected or ir.startup()):
+                connected = True
+                reconnect_delay = .05
+                logging.info('sampler: IRSDK connected')
+
+            if not connected:
+                time.sleep(reconnect_delay)
+                reconnect_delay = min(reconnect_max, reconnect_delay * 2)
+                continue
+
+            if not waiter.wait():
+                continue
+            ir.freeze_var_buffer_latest()
+            try:
+                values = {key: ir[key] for key in var_names}
+            finally:
+                ir.unfreeze_var_buffer_latest()
+            ring.put((values, None))
+            # connected only after first frame, so renderer never sees empty values
+            if not ring_connected:
+                ring_connected = True
+                ring.set_connected(True)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if not ring.mm.closed:
+            ring.set_connected(False)
+            ring.close()
+        ir.shutdown()
+
+def spawn(args):
+    # child runs same executable, frozen build has no script
+    if getattr(sys, 'frozen', False):
+        command = [sys.executable]
+    else:
+        command = [sys.executable, os.path.abspath(sys.argv[0])]
+    return subprocess.Popen(command + args)
@@ -0,0 +1,85 @@
+#!python3
+
+import time
+
+class Task:
+    def __init__(self, name, func, interval=0, priority=0, catch_up=False):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.priority = priority
+        self.catch_up = catch_up
+        self.last_time = -1
+        self.next_time = -1
+        self.runs = 0
+        self.skipped = 0
+        self.deferred = 0
+
+    def is_due(self, now):
+        # time could go backwards in replay, treat it as due
+        return self.next_time == -1 or now >= self.next_time or now < self.last_time
+
+    def schedule_next(self, now):
+        if not self.interval:
+            self.next_time = now
+        elif self.catch_up and self.next_time != -1 and self.last_time <= now:
+            self.next_time += self.interval
+            # don't try to catch up after long stall (pause, loading)
+            missed = int((now - self.next_time) / self.interval)
+            if missed > 3:
+                self.skipped += missed
+                self.next_time += missed * self.interval
+        else:
+            if self.next_time != -1 and now >= self.next_time + self.interval:
+                self.skipped += int((now - self.next_time) / self.interval)
+            self.next_time = now + self.interval
+        self.last_time = now
+
+class Scheduler:
+    def __init__(self, budget=0):
+        self.budget = budget
+        self.tasks = []
+        self.stats = None
+
+    def add(self, name, func, interval=0, priority=0, catch_up=False):
+        task = Task(name, func, interval, priority, catch_up)
+        self.tasks.append(task)
+        # stable sort keeps registration order for equal priority
+        self.tasks.sort(key=lambda t: -t.priority)
+        return task
+
+    def configure(self, name, interval=0, priority=0, catch_up=False):
+        task = self.get(name)
+        task.interval = interval
+        task.priority = priority
+        task.catch_up = catch_up
+        self.tasks.sort(key=lambda t: -t.priority)
+        return task
+
+    def get(self, name):
+        return next(t for t in self.tasks if t.name == name)
+
+    def reset(self, *names):
+        for task in self.tasks:
+            if not names or task.name in names:
+                task.last_time = task.next_time = -1
+
+    def run(self, now):
+        start = time.perf_counter()
+        ran = False
+        for task in self.tasks:
+            if not task.is_due(now):
+                continue
+            # out of tick budget, leave lower priority tasks for next tick
+            if ran and self.budget and time.perf_counter() - start > self.budget:
+                task.deferred += 1
+                continue
+            task.schedule_next(now)
+            task.runs += 1
+            if self.stats:
+                task_start = time.perf_counter()
+                task.func()
+                self.stats.since(task.name, task_start)
+            else:
+                task.func()
+            ran = True
@@ -0,0 +1,193 @@
+#!python3
+
+import json
+import base64
+import struct
+import asyncio
+import hashlib
+import logging
+import threading
+from urllib import parse
+
+WS_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+# drop websocket client when it can't keep up
+MAX_CLIENT_BUFFER = 1024 ** 2
+
+OP_TEXT = 0x1
+OP_CLOSE = 0x8
+OP_PING = 0x9
+OP_PONG = 0xA
+
+# browser source page, shows one widget, ex: http://127.0.0.1:8182/?widget=standing
+INDEX_HTML = '''<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>iRacing Text Overlay</title>
+<style>body { margin: 0; color: #fff; font: 16px monospace; white-space: pre; }</style></head>
+<body><div id="widget"></div><script>
+var widget = new URLSearchParams(location.search).get('widget') || 'speed_rpm';
+function connect() {
+    var ws = new WebSocket('ws://' + location.host + '/ws');
+    ws.onmessage = function(e) {
+        var data = JSON.parse(e.data);
+        if (data.name == widget) document.getElementById('widget').textContent = data.text;
+    };
+    ws.onclose = function() { setTimeout(connect, 1000); };
+}
+connect();
+</script></body></html>
+'''
+
+def ws_frame(opcode, payload):
+    length = len(payload)
+    if length < 126:
+        header = struct.pack('!BB', 0x80 | opcode, length)
+    elif length < 65536:
+        header = struct.pack('!BBH', 0x80 | opcode, 126, length)
+    else:
+        header = struct.pack('!BBQ', 0x80 | opcode, 127, length)
+    return header + payload
+
+async def ws_read_frame(reader):
+    b1, b2 = await reader.readexactly(2)
+    opcode = b1 & 0x0F
+    length = b2 & 0x7F
+    if length == 126:
+        length, = struct.unpack('!H', await reader.readexactly(2))
+    elif length == 127:
+        length, = struct.unpack('!Q', await reader.readexactly(8))
+    mask = await reader.readexactly(4) if b2 & 0x80 else None
+    payload = await reader.readexactly(length)
+    if mask:
+        payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+    return opcode, payload
+
+class OverlayServer:
+    def __init__(self, host='127.0.0.1', port=8182):
+        self.host = host
+        self.port = port
+        self.widgets = {}
+        self.clients = set()
+        # connection handler tasks and their writers, closed on stop
+        self.tasks = {}
+        self.loop = None
+        self.server = None
+        self.thread = None
+        self._started = threading.Event()
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name='overlay-server', daemon=True)
+        self.thread.start()
+        self._started.wait(5)
+
+    def stop(self):
+        if self.loop:
+            try:
+                asyncio.run_coroutine_threadsafe(self._shutdown(), self.loop).result(5)
+            except Exception as e:
+                logging.warning('overlay server: clients not closed: %r', e)
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join(5)
+
+    async def _shutdown(self):
+        # loop should not be closed with pending connection handlers, closed connection ends handler
+        self.server.close()
+        for writer in list(self.clients):
+            writer.write(ws_frame(OP_CLOSE, struct.pack('!H', 1001)))
+        for writer in list(self.tasks.values()):
+            writer.close()
+        if self.tasks:
+            await asyncio.wait(list(self.tasks), timeout=2)
+
+    def publish(self, name, text):
+        # called from main thread
+        self.widgets[name] = text
+        if self.loop and self.clients:
+            self.loop.call_soon_threadsafe(self._broadcast, name, text)
+
+    def _run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.server = self.loop.run_until_complete(asyncio.start_server(self._handle, self.host, self.port))
+        except OSError as e:
+            logging.error('overlay server failed to start on %s:%d: %s', self.host, self.port, e)
+            self.loop = None
+            self._started.set()
+            return
+        logging.info('overlay server started on http://%s:%d/', self.host, self.port)
+        self._started.set()
+        try:
+            self.loop.run_forever()
+        finally:
+            self.server.close()
+            self.loop.close()
+
+    def _message(self, name, text):
+        return ws_frame(OP_TEXT, json.dumps(dict(name=name, text=text)).encode('utf-8'))
+
+    def _broadcast(self, name, text):
+        frame = self._message(name, text)
+        for writer in list(self.clients):
+            if writer.transport.get_write_buffer_size() > MAX_CLIENT_BUFFER:
+                logging.warning('overlay server: dropping slow client')
+                self.clients.discard(writer)
+                writer.close()
+            else:
+                writer.write(frame)
+
+    async def _handle(self, reader, writer):
+        task = asyncio.current_task()
+        self.tasks[task] = writer
+        try:
+            request_line = (await reader.readline()).decode('latin-1').split()
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode('latin-1').strip()
+                if not line:
+                    break
+                key, _, value = line.partition(':')
+                headers[key.strip().lower()] = value.strip()
+
+            if len(request_line) < 2 or request_line[0] != 'GET':
+                return self._respond(writer, 405, 'text/plain', b'method not allowed')
+
+            url = parse.urlsplit(request_line[1])
+            if url.path == '/ws' and headers.get('upgrade', '').lower() == 'websocket':
+                await self._handle_ws(reader, writer, headers)
+            elif url.path == '/':
+                self._respond(writer, 200, 'text/html; charset=utf-8', INDEX_HTML.encode('utf-8'))
+            elif url.path == '/state':
+                self._respond(writer, 200, 'application/json', json.dumps(dict(self.widgets)).encode('utf-8'))
+            elif url.path[1:] in self.widgets:
+                self._respond(writer, 200, 'text/plain; charset=utf-8', self.widgets[url.path[1:]].encode('utf-8'))
+            else:
+                self._respond(writer, 404, 'text/plain', b'not found')
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.tasks.pop(task, None)
+            self.clients.discard(writer)
+            writer.close()
+
+    def _respond(self, writer, status, content_type, body):
+        writer.write(('HTTP/1.1 {} {}\r\nContent-Type: {}\r\nContent-Length: {}\r\n'
+            'Cache-Control: no-cache\r\nAccess-Control-Allow-Origin: *\r\nConnection: close\r\n\r\n').format(
+            status, {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed'}[status],
+            content_type, len(body)).encode('latin-1') + body)
+
+    async def _handle_ws(self, reader, writer, headers):
+        if 'sec-websocket-key' not in headers:
+            return self._respond(writer, 400, 'text/plain', b'missing Sec-WebSocket-Key')
+        accept = base64.b64encode(hashlib.sha1((headers['sec-websocket-key'] + WS_GUID).encode('latin-1')).digest())
+        writer.write(b'HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n'
+            b'Sec-WebSocket-Accept: ' + accept + b'\r\n\r\n')
+        for name, text in list(self.widgets.items()):
+            writer.write(self._message(name, text))
+        self.clients.add(writer)
+
+        while True:
+            opcode, payload = await ws_read_frame(reader)
+            if opcode == OP_CLOSE:
+                writer.write(ws_frame(OP_CLOSE, payload[:2]))
+                break
+            elif opcode == OP_PING:
+                writer.write(ws_frame(OP_PONG, payload))
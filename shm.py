@@ -0,0 +1,252 @@
+#!python3
+
+import os
+import sys
+import mmap
+import time
+import struct
+import tempfile
+
+# shared memory layout, all little endian
+#
+# header, 16 bytes
+#   0  char[4]   magic 'IRTO'
+#   4  uint16    version
+#   6  uint16    header size
+#   8  uint32    sequence, odd while writer updates data
+#   12 uint32    reserved
+#
+# state, 48 bytes
+#   16 double    session time, seconds
+#   24 int32     cam car idx, -1 when not in world
+#   28 float     speed, m/s
+#   32 int32     gear, -1 reverse, 0 neutral
+#   36 float     rpm fraction 0..1, -1 unknown
+#   40 int32     cam car index in neighbours, -1 unknown
+#   44 int32     standing rows count
+#   48 int32[4]  reserved
+#
+# neighbours, int16[NEIGHBOURS]: car idx ordered ahead to behind around cam car, -1 empty
+#
+# standing rows, STANDING_ROWS of 64 bytes
+#   0  int16     position
+#   2  int16     car idx
+#   4  char[4]   car number, utf-8, zero padded
+#   8  char[32]  name, utf-8, zero padded
+#   40 char[24]  gap and interval text as in standing output
+#
+# reader should read sequence, copy data, read sequence again and retry if it is odd or changed
+
+MAGIC = b'IRTO'
+VERSION = 1
+DEFAULT_NAME = 'ir-text-overlay'
+
+NEIGHBOURS = 7
+STANDING_ROWS = 64
+
+HEADER = struct.Struct('<4sHHII')
+SEQUENCE = struct.Struct('<I')
+SEQUENCE_OFFSET = 8
+STATE = struct.Struct('<dififii16x')
+NEIGHBOURS_STRUCT = struct.Struct('<%dh' % NEIGHBOURS)
+ROW = struct.Struct('<hh4s32s24s')
+
+STATE_OFFSET = HEADER.size
+NEIGHBOURS_OFFSET = STATE_OFFSET + STATE.size
+ROWS_OFFSET = NEIGHBOURS_OFFSET + NEIGHBOURS_STRUCT.size
+SIZE = ROWS_OFFSET + ROW.size * STANDING_ROWS
+
+def mapping_path(name):
+    directory = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    return os.path.join(directory, name)
+
+def open_mapping(name, create=False, size=SIZE, write=False):
+    if os.name == 'nt':
+        # named shared memory, readers open it with same tag name
+        return mmap.mmap(-1, size, tagname=name)
+    if create:
+        flags = os.O_RDWR | os.O_CREAT
+    else:
+        flags = os.O_RDWR if write else os.O_RDONLY
+    fd = os.open(mapping_path(name), flags, 0o644)
+    try:
+        if create:
+            os.ftruncate(fd, size)
+        if create or write:
+            return mmap.mmap(fd, size)
+        return mmap.mmap(fd, size, access=mmap.ACCESS_READ)
+    finally:
+        os.close(fd)
+
+def remove_mapping(name):
+    # named shared memory on windows is freed with last handle
+    if os.name != 'nt':
+        try:
+            os.remove(mapping_path(name))
+        except OSError:
+            pass
+
+def field(mm, offset, fmt):
+    # view of single aligned number, item assignment is one store, unlike struct.pack_into
+    # which clears bytes before packing, so reader could see zero in between
+    # native byte order, it is little endian on every platform sim runs on
+    size = struct.calcsize(fmt)
+    return memoryview(mm)[offset:offset + size].cast(fmt)
+
+def encode(text, size):
+    # cut on byte length without breaking multibyte chars
+    return str(text).encode('utf-8')[:size].decode('utf-8', 'ignore').encode('utf-8')
+
+class SharedState:
+    # overlay state, collected by widgets and written once per tick if changed
+    def __init__(self, name=DEFAULT_NAME):
+        self.name = name
+        self.mm = open_mapping(name, create=True)
+        self.sequence = 0
+        self.writes = 0
+        self.sequence_field = field(self.mm, SEQUENCE_OFFSET, 'I')
+        HEADER.pack_into(self.mm, 0, MAGIC, VERSION, HEADER.size, self.sequence, 0)
+        self.reset()
+
+    def reset(self):
+        self.session_time = 0
+        self.cam_car_idx = -1
+        self.speed = 0
+        self.gear = 0
+        self.rpm = -1
+        self.neighbours = []
+        self.cam_neighbour = -1
+        self.rows = []
+        self.changed = True
+
+    def set_car(self, speed, gear, rpm):
+        # missing values are stored as neutral gear and unknown rpm
+        self.speed = speed or 0
+        self.gear = 0 if gear is None else gear
+        self.rpm = -1 if rpm is None else rpm
+        self.changed = True
+
+    def set_neighbours(self, cars, cur_pos):
+        # keep cars around cam car only
+        start = max(0, min(cur_pos - NEIGHBOURS // 2, len(cars) - NEIGHBOURS)) if cur_pos != -1 else 0
+        self.neighbours = cars[start:start + NEIGHBOURS] if cur_pos != -1 else []
+        self.cam_neighbour = cur_pos - start if cur_pos != -1 else -1
+        self.changed = True
+
+    def set_rows(self, rows):
+        # rows of (position, car_idx, car_number, name, diff)
+        self.rows = rows[:STANDING_ROWS]
+        self.changed = True
+
+    def commit(self, session_time, cam_car_idx):
+        if not self.changed and cam_car_idx == self.cam_car_idx:
+            return False
+        self.session_time = session_time
+        self.cam_car_idx = cam_car_idx
+        mm = self.mm
+
+        self.sequence += 1
+        self.sequence_field[0] = self.sequence & 0xFFFFFFFF
+
+        STATE.pack_into(mm, STATE_OFFSET, session_time, cam_car_idx, self.speed, self.gear, self.rpm,
+            self.cam_neighbour, len(self.rows))
+        neighbours = list(self.neighbours) + [-1] * (NEIGHBOURS - len(self.neighbours))
+        NEIGHBOURS_STRUCT.pack_into(mm, NEIGHBOURS_OFFSET, *neighbours)
+        for i, (pos, car_idx, car_number, name, diff) in enumerate(self.rows):
+            ROW.pack_into(mm, ROWS_OFFSET + i * ROW.size, pos, car_idx,
+                encode(car_number, 4), encode(name, 32), encode(diff, 24))
+
+        self.sequence += 1
+        self.sequence_field[0] = self.sequence & 0xFFFFFFFF
+        self.changed = False
+        self.writes += 1
+        return True
+
+    def close(self):
+        self.sequence_field.release()
+        self.mm.close()
+
+class SharedReader:
+    def __init__(self, name=DEFAULT_NAME):
+        self.mm = open_mapping(name)
+        self.retries = 0
+        magic, version, _, _, _ = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('unknown shared memory format {} {}'.format(magic, version))
+
+    def read_raw(self):
+        # consistent copy of data part
+        mm = self.mm
+        while True:
+            before, = SEQUENCE.unpack_from(mm, SEQUENCE_OFFSET)
+            if not before & 1:
+                data = mm[STATE_OFFSET:SIZE]
+                after, = SEQUENCE.unpack_from(mm, SEQUENCE_OFFSET)
+                if before == after:
+                    return before, data
+            self.retries += 1
+            time.sleep(0)
+
+    def read(self):
+        sequence, data = self.read_raw()
+        session_time, cam_car_idx, speed, gear, rpm, cam_neighbour, rows_count = STATE.unpack_from(data, 0)
+        neighbours = [c for c in NEIGHBOURS_STRUCT.unpack_from(data, NEIGHBOURS_OFFSET - STATE_OFFSET) if c != -1]
+        rows = []
+        for i in range(rows_count):
+            pos, car_idx, car_number, name, diff = ROW.unpack_from(data, ROWS_OFFSET - STATE_OFFSET + i * ROW.size)
+            rows.append((pos, car_idx, car_number.rstrip(b'\0').decode('utf-8'),
+                name.rstrip(b'\0').decode('utf-8'), diff.rstrip(b'\0').decode('utf-8')))
+        return dict(sequence=sequence, session_time=session_time, cam_car_idx=cam_car_idx, speed=speed, gear=gear,
+            rpm=rpm, neighbours=neighbours, cam_neighbour=cam_neighbour, standing=rows)
+
+    def close(self):
+        self.mm.close()
+
+def _check_writer(name, duration):
+    # every field is derived from counter, so torn read shows up as mismatch
+    shared = SharedState(name)
+    start = time.time()
+    i = 0
+    while time.time() - start < duration:
+        i += 1
+        shared.set_car(i % 100, i % 7, (i % 10) / 10)
+        shared.set_neighbours([(i + k) % 64 for k in range(NEIGHBOURS)], NEIGHBOURS // 2)
+        shared.set_rows([(k + 1, (i + k) % 64, str(i % 1000), 'Driver %d' % i, str(i)) for k in range(i % STANDING_ROWS)])
+        shared.commit(i, i % 64)
+    shared.close()
+
+def check(name=DEFAULT_NAME + '-check', duration=3):
+    import multiprocessing
+    SharedState(name).close()
+    writer = multiprocessing.Process(target=_check_writer, args=(name, duration))
+    writer.start()
+    reader = SharedReader(name)
+    reads = errors = 0
+    last_sequence = 0
+    while writer.is_alive():
+        state = reader.read()
+        i = int(state['session_time'])
+        if not i:
+            continue
+        reads += 1
+        expected_rows = [(k + 1, (i + k) % 64, str(i % 1000), 'Driver %d' % i, str(i)) for k in range(i % STANDING_ROWS)]
+        if state['sequence'] < last_sequence or state['cam_car_idx'] != i % 64 or state['speed'] != i % 100 or \
+            state['gear'] != i % 7 or state['neighbours'] != [(i + k) % 64 for k in range(NEIGHBOURS)] or \
+            state['standing'] != expected_rows:
+            errors += 1
+        last_sequence = state['sequence']
+    writer.join()
+    reader.close()
+    remove_mapping(name)
+    print('{} reads, {} retries, {} inconsistent'.format(reads, reader.retries, errors))
+    return errors == 0
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['--check']:
+        sys.exit(0 if check() else 1)
+    reader = SharedReader(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_NAME)
+    state = reader.read()
+    for key in ('sequence', 'session_time', 'cam_car_idx', 'speed', 'gear', 'rpm', 'neighbours', 'cam_neighbour'):
+        print(key, state[key])
+    for row in state['standing']:
+        print(*row)
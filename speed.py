@@ -0,0 +1,53 @@
+#!python3
+
+from array import array
+
+# speed above that (m/s) is treated as glitch, ex: car was reset to pits
+MAX_SPEED = 110
+
+class SpeedTracker:
+    # ring buffer of lap distance/time samples for every car
+    # all cars are sampled on every tick, so they share same write position
+    def __init__(self, cars=64, samples=10):
+        self.cars = cars
+        self.samples = samples
+        self.pcts = array('d', [0]) * (cars * samples)
+        self.times = array('d', [0]) * (cars * samples)
+        self.counts = array('i', [0]) * cars
+        self.head = 0
+
+    def reset(self):
+        self.counts = array('i', [0]) * self.cars
+        self.head = 0
+
+    def update(self, lap_dist_pcts, session_time):
+        pcts, times, counts = self.pcts, self.times, self.counts
+        samples = self.samples
+        i = self.head
+        for car_idx, pct in zip(range(self.cars), lap_dist_pcts):
+            if pct == -1:
+                counts[car_idx] = 0
+            else:
+                pcts[i] = pct
+                times[i] = session_time
+                if counts[car_idx] < samples:
+                    counts[car_idx] += 1
+            i += samples
+        self.head = (self.head + 1) % samples
+
+    def speed(self, car_idx, track_length):
+        # m/s, track_length in km
+        count = self.counts[car_idx]
+        if count < 2:
+            return 0
+        base = car_idx * self.samples
+        newest = base + (self.head - 1) % self.samples
+        oldest = base + (self.head - count) % self.samples
+        diff_pct = self.pcts[newest] - self.pcts[oldest]
+        if diff_pct < 0: diff_pct += 1
+        diff_time = max(0, self.times[newest] - self.times[oldest])
+        if diff_pct > 0 and diff_time > 0:
+            speed = max(0, track_length * diff_pct / diff_time * 1000)
+            if speed <= MAX_SPEED:
+                return speed
+        return 0
@@ -0,0 +1,59 @@
+#!python3
+
+class StandingIndex:
+    # drivers grouped by car class, group order is cached and sorted again only when its drivers change
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.classes = {}
+        self.class_names = {}
+        self.car_classes = {}
+        self.ordered_cache = {}
+
+    def update(self, drivers, changed=None):
+        # changed - car indexes with new driver or position info, None - everything changed
+        if changed is None:
+            self.reset()
+            changed = drivers.keys()
+        for car_idx in changed:
+            driver = drivers.get(car_idx)
+            old_class_id = self.car_classes.get(car_idx)
+            if driver is None or old_class_id != driver.car_class_id:
+                if old_class_id is not None:
+                    self.classes[old_class_id].pop(car_idx, None)
+                    if not self.classes[old_class_id]:
+                        del self.classes[old_class_id]
+                        del self.class_names[old_class_id]
+                    self._invalidate(old_class_id)
+                    del self.car_classes[car_idx]
+                if driver is None:
+                    continue
+                self.car_classes[car_idx] = driver.car_class_id
+                self.classes.setdefault(driver.car_class_id, {})[car_idx] = driver
+            self.class_names[driver.car_class_id] = driver.car_class_name
+            self._invalidate(driver.car_class_id)
+
+    def _invalidate(self, class_id):
+        for use_pos_info in (True, False):
+            self.ordered_cache.pop((class_id, use_pos_info), None)
+            self.ordered_cache.pop((None, use_pos_info), None)
+
+    def ordered(self, class_id, use_pos_info):
+        # class_id None - all classes, drivers without position (qualify) info are skipped
+        key = (class_id, use_pos_info)
+        try:
+            return self.ordered_cache[key]
+        except KeyError:
+            pass
+        if class_id is None:
+            drivers = [d for group in self.classes.values() for d in group.values()]
+        else:
+            drivers = list(self.classes.get(class_id, {}).values())
+        if use_pos_info:
+            result = sorted((d for d in drivers if d.has_position_info),
+                key=lambda d: d.position if class_id is None else d.class_position)
+        else:
+            result = sorted((d for d in drivers if d.has_qual_info), key=lambda d: d.qual_position)
+        self.ordered_cache[key] = result
+        return result
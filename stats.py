@@ -0,0 +1,136 @@
+#!python3
+
+import json
+import time
+import logging
+
+# histogram bucket upper bounds in milliseconds, last bucket is everything above
+BUCKETS = (.05, .1, .25, .5, 1, 2.5, 5, 10, 25, 50, 100, 250, 1000)
+
+class Histogram:
+    __slots__ = ('counts', 'count', 'total', 'max')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def add(self, seconds):
+        ms = seconds * 1000
+        i = 0
+        while i < len(BUCKETS) and ms > BUCKETS[i]:
+            i += 1
+        self.counts[i] += 1
+        self.count += 1
+        self.total += ms
+        if ms > self.max:
+            self.max = ms
+
+    def percentile(self, p):
+        # upper bound of bucket, where percentile falls
+        target = self.count * p
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= target and count:
+                return BUCKETS[i] if i < len(BUCKETS) else self.max
+        return 0
+
+    def to_dict(self):
+        return dict(count=self.count, avg=self.total / self.count if self.count else 0,
+            p50=self.percentile(.5), p95=self.percentile(.95), max=self.max,
+            buckets=dict(zip([str(b) for b in BUCKETS] + ['inf'], self.counts)))
+
+    def summary(self):
+        if not self.count:
+            return 'no samples'
+        return '{} calls, avg {:.3f}ms, p50 <{}ms, p95 <{}ms, max {:.3f}ms'.format(
+            self.count, self.total / self.count, self.percentile(.5), self.percentile(.95), self.max)
+
+class Stats:
+    def __init__(self, sink, tick_interval=1/60, report_interval=60, path=None):
+        self.sink = sink
+        self.tick_interval = tick_interval
+        self.report_interval = report_interval
+        self.path = path
+        # optional sources of counters, set by owner
+        self.scheduler = None
+        self.shared = None
+        self.twitch = None
+        self.reset()
+
+    def reset(self):
+        self.stages = {}
+        self.tick_time = Histogram()
+        self.jitter = Histogram()
+        self.ticks = 0
+        self.overruns = 0
+        self.last_tick_start = None
+        self.last_report = time.perf_counter()
+
+    def add(self, name, seconds):
+        try:
+            stage = self.stages[name]
+        except KeyError:
+            stage = self.stages[name] = Histogram()
+        stage.add(seconds)
+
+    def since(self, name, start):
+        # add stage time, returns current time, so it could be used as start of next stage
+        now = time.perf_counter()
+        self.add(name, now - start)
+        return now
+
+    def tick_done(self, start):
+        now = time.perf_counter()
+        self.ticks += 1
+        self.tick_time.add(now - start)
+        if now - start > self.tick_interval:
+            self.overruns += 1
+        if self.last_tick_start is not None:
+            self.jitter.add(abs(start - self.last_tick_start - self.tick_interval))
+        self.last_tick_start = start
+
+        if now - self.last_report >= self.report_interval:
+            self.report()
+            self.reset()
+
+    def report(self):
+        if self.path:
+            data = dict(ticks=self.ticks, overruns=self.overruns,
+                tick=self.tick_time.to_dict(), jitter=self.jitter.to_dict(),
+                stages={name: stage.to_dict() for name, stage in self.stages.items()},
+                writes={name: dict(writes=w, skipped=s, coalesced=c) for name, (w, s, c) in self.sink.counts().items()})
+            if self.scheduler:
+                data['widgets'] = {task.name: dict(runs=task.runs, skipped=task.skipped, deferred=task.deferred)
+                    for task in self.scheduler.tasks}
+            if self.shared:
+                data['shared_memory_writes'] = self.shared.writes
+            if self.twitch:
+                data['twitch_requests'] = self.twitch.requests
+            writer = self.sink.writer
+            if writer:
+                data['writer'] = dict(depth=writer.depth(), max_depth=writer.max_depth, coalesced=writer.coalesced,
+                    latency=writer.latency.to_dict())
+            with open(self.path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=2, sort_keys=True)
+            return
+
+        logging.info('stats: %d ticks, %d overruns (>%.1fms)', self.ticks, self.overruns, self.tick_interval * 1000)
+        logging.info('stats: tick: %s', self.tick_time.summary())
+        logging.info('stats: jitter: %s', self.jitter.summary())
+        for name, stage in sorted(self.stages.items()):
+            logging.info('stats: %s: %s', name, stage.summary())
+        if self.scheduler:
+            for task in self.scheduler.tasks:
+                logging.info('stats: widget %s: %d runs, %d skipped, %d deferred',
+                    task.name, task.runs, task.skipped, task.deferred)
+        for name, (writes, skips, coalesced) in sorted(self.sink.counts().items()):
+            logging.info('stats: %s: %d writes, %d skipped, %d coalesced', name, writes, skips, coalesced)
+        if self.sink.writer:
+            logging.info('stats: output writer: %s', self.sink.writer.summary())
+        if self.shared:
+            logging.info('stats: shared memory: %d writes', self.shared.writes)
+        if self.twitch:
+            logging.info('stats: twitch: %d requests', self.twitch.requests)
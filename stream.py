@@ -1,20 +1,51 @@
 #!python3
 
+import time
+# startup time is measured from here to first frame
+START_TIME = time.perf_counter()
+
+import os
 import sys
 import shutil
 import re
-import time
 import math
 import logging, logging.handlers
 import argparse
 import json
 import irsdk
-import twitch
+import output
+import telemetry
+import scheduler
+import relative
+import templates
+import speed as car_speed
+import gaps as car_gaps
+import standings
+import laps
+import fuel as car_fuel
+# optional subsystems (twitch, server, shm, replay, recorder, stats) are imported only when enabled,
+# stats also by background output writer
 
 VERSION = '1.0.3.1'
 
 LICENSE_CLASSES = ['R', 'D', 'C', 'B', 'A', 'P', 'WC']
 
+TELEMETRY_OUTPUTS = ('speed_rpm', 'lap_ses_time', 'position', 'standing')
+TWITCH_OUTPUTS = ('twitch_last_follower', 'twitch_viewers_followers')
+
+# widget: (interval, priority)
+DEFAULT_SCHEDULE = {
+    'speed_rpm': (0, 4),
+    'lap_ses_time': (.5, 3),
+    'drivers': (1, 2),
+    'position': (1, 1),
+    'standing': (1, 0),
+}
+
+# sim connection is checked often after start or disconnect, then less often while sim is not running
+RECONNECT_MIN = .05
+RECONNECT_MAX = 1
+
 class State:
     is_connected = False
 
@@ -38,106 +69,324 @@ class State:
 
     drivers = {}
 
-    speed_calc_data = []
-
-    last_time_update_lap_ses_time = -1
     race_start_time = -1
 
-    last_time_update_drivers = -1
-
-    last_time_update_positions = -1
-    cur_dist_pct = 0
-    last_dist_pct = 0
+    # per class standings outputs written last time
+    class_outputs = set()
 
-    last_time_update_standing = -1
+    reconnect_delay = RECONNECT_MIN
 
     twitch = None
 
+class Profile:
+    # set of templates and output files, all profiles share same telemetry and state
+    def __init__(self, name, tmpl, output_dir):
+        self.name = name
+        self.tmpl = tmpl
+        self.output_dir = output_dir
+        self.prefix = name + '/' if name else ''
+        self.names = []
+
+    def add(self, *names):
+        for name in names:
+            out.add(self.prefix + name, os.path.join(self.output_dir, name + '.txt'))
+            self.names.append(name)
+
+    def remove(self):
+        out.remove(*[self.prefix + name for name in self.names])
+        self.names = []
+
+    def write(self, name, text):
+        out.write(self.prefix + name, text)
+
+    def clear(self, *names):
+        names = [self.prefix + name for name in names if name in self.names]
+        # sink clears everything when no names given
+        if names:
+            out.clear(*names)
+
+class SettingsWatcher:
+    # checks settings file modification time at most once per interval
+    def __init__(self, path, interval=1):
+        self.path = path
+        self.interval = interval
+        self.next_check = time.perf_counter() + interval
+        self.mtime = self._mtime()
+
+    def _mtime(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def changed(self):
+        now = time.perf_counter()
+        if now < self.next_check:
+            return False
+        self.next_check = now + self.interval
+        mtime = self._mtime()
+        if mtime == self.mtime:
+            return False
+        self.mtime = mtime
+        return mtime is not None
+
+class Driver:
+    __slots__ = ('car_idx', 'car_number', 'car_class_id', 'car_class_name', 'user_name', 'abbrev_name', 'irating',
+        'license_class', 'safety_rating', 'position', 'class_position', 'lap_distance',
+        'has_position_info', 'last_time', 'fastest_time', 'time', 'laps_complete',
+        'has_qual_info', 'qual_position', 'qual_fastest_time')
+
+    def __init__(self, car_idx):
+        self.car_idx = car_idx
+        self.car_number = self.car_class_name = self.user_name = self.abbrev_name = ''
+        self.car_class_id = self.irating = 0
+        self.license_class = LICENSE_CLASSES[0]
+        self.safety_rating = ''
+        self.position = self.class_position = 0
+        self.lap_distance = -1
+        self.has_position_info = False
+        self.last_time = self.fastest_time = self.time = -1
+        self.laps_complete = 0
+        self.has_qual_info = False
+        self.qual_position = self.qual_fastest_time = -1
+
+    def set_driver_info(self, d):
+        self.car_number = d['CarNumber']
+        self.car_class_id = d['CarClassID']
+        self.car_class_name = d['CarClassShortName'] or str(d['CarClassID'])
+        self.user_name = d['UserName']
+        self.abbrev_name = d['AbbrevName']
+        self.irating = d['IRating']
+        self.license_class = LICENSE_CLASSES[int(max(0, (d['LicLevel'] - 1)) / 4)]
+        self.safety_rating = '{:.2f}'.format(d['LicSubLevel'] / 100)
+
+    def set_position_info(self, pos):
+        self.has_position_info = True
+        self.position = pos['Position']
+        self.class_position = pos['ClassPosition'] + 1
+        self.last_time = pos['LastTime']
+        self.fastest_time = pos['FastestTime']
+        self.time = pos['Time']
+        self.laps_complete = pos['LapsComplete']
+
+    def set_qual_info(self, pos):
+        self.has_qual_info = True
+        self.qual_position = pos['Position']
+        self.qual_fastest_time = pos['FastestTime']
+
 class TwitchState:
     channel = None
     oauth_token = None
 
     status = None
     last_status = None
-    twreq_status = None
+    pending_status = None
 
     last_update = -1
     last_viewers = 0
     last_followers = 0
     last_follower = None
     pending = False
-    twreq_stream = None
-    twreq_follows = None
+    client = None
+    poll_interval = None
+
+
+def load_settings(path='settings.json'):
+    with open(path, 'r', encoding='utf-8') as f:
+        settings = json.loads(re.sub(r'^\s*\/\/.*', '', f.read(), flags=re.M))
+    if not isinstance(settings, dict):
+        raise ValueError('settings should be object')
+    return settings
+
+def load_profiles(settings):
+    profiles = [Profile('', templates.Templates(settings), '.')]
+    profile_list = settings.get('profiles', [])
+    if not isinstance(profile_list, list):
+        raise templates.TemplateError('profiles: should be list')
+    # two profiles with same name or directory would write same outputs
+    names = set()
+    output_dirs = {os.path.normcase(os.path.abspath('.'))}
+    for profile_settings in profile_list:
+        if not isinstance(profile_settings, dict):
+            raise templates.TemplateError('profiles: every profile should be object')
+        name = profile_settings.get('name')
+        if not isinstance(name, str) or not name:
+            raise templates.TemplateError('every profile should have "name"')
+        if name in names:
+            raise templates.TemplateError('profile "{}": duplicate name'.format(name))
+        names.add(name)
+        output_dir = profile_settings.get('output_dir', name)
+        if not isinstance(output_dir, str) or not output_dir:
+            raise templates.TemplateError('profile "{}": "output_dir" should be non-empty string'.format(name))
+        output_dir_key = os.path.normcase(os.path.abspath(output_dir))
+        if output_dir_key in output_dirs:
+            raise templates.TemplateError('profile "{}": "output_dir" is used by another profile'.format(name))
+        output_dirs.add(output_dir_key)
+        try:
+            tmpl = templates.Templates(templates.profile_settings(settings, profile_settings))
+        except templates.TemplateError as e:
+            raise templates.TemplateError('profile "{}": {}'.format(name, e))
+        profiles.append(Profile(name, tmpl, output_dir))
+    # profiles are split between renderer processes, first one always has default profile
+    return profiles[renderer_index::renderer_count]
+
+def add_profile_outputs(profile):
+    if out.write_files:
+        os.makedirs(profile.output_dir, exist_ok=True)
+    profile.add(*TELEMETRY_OUTPUTS)
+    if state.twitch:
+        profile.add(*TWITCH_OUTPUTS)
+
+def is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and value >= 0
+
+def load_schedule(settings):
+    # returns (budget, {widget name: (interval, priority, catch_up)})
+    schedule_settings = settings.get('schedule', {})
+    if not isinstance(schedule_settings, dict):
+        raise templates.TemplateError('schedule: should be dict')
+    budget = schedule_settings.get('budget', 0)
+    if not is_number(budget):
+        raise templates.TemplateError('schedule.budget: should be non-negative number')
+    schedule = {}
+    for name, (interval, priority) in DEFAULT_SCHEDULE.items():
+        widget_settings = schedule_settings.get(name, {})
+        if not isinstance(widget_settings, dict):
+            raise templates.TemplateError('schedule.{}: should be dict'.format(name))
+        interval = widget_settings.get('interval', interval)
+        priority = widget_settings.get('priority', priority)
+        catch_up = widget_settings.get('catch_up', False)
+        if not is_number(interval):
+            raise templates.TemplateError('schedule.{}.interval: should be non-negative number'.format(name))
+        if not isinstance(priority, int) or isinstance(priority, bool):
+            raise templates.TemplateError('schedule.{}.priority: should be int'.format(name))
+        if not isinstance(catch_up, bool):
+            raise templates.TemplateError('schedule.{}.catch_up: should be bool'.format(name))
+        schedule[name] = (interval, priority, catch_up)
+    return budget, schedule
+
+def configure_widgets(schedule):
+    widgets.budget, widget_schedule = schedule
+    for name, (interval, priority, catch_up) in widget_schedule.items():
+        widgets.configure(name, interval=interval, priority=priority, catch_up=catch_up)
+
+def reload_settings():
+    global settings, profiles
+
+    try:
+        new_settings = load_settings()
+        new_profiles = load_profiles(new_settings)
+        new_schedule = load_schedule(new_settings)
+        if out.write_files:
+            for profile in new_profiles:
+                os.makedirs(profile.output_dir, exist_ok=True)
+    except (OSError, ValueError, templates.TemplateError) as e:
+        logging.error('Settings not reloaded, previous settings are kept: %s', e)
+        return
+
+    # everything is validated, nothing below should fail
+    configure_widgets(new_schedule)
+
+    # profiles with same name and directory keep their output files
+    old_profiles = {(p.name, p.output_dir): p for p in profiles}
+    new_keys = set()
+    for profile in new_profiles:
+        new_keys.add((profile.name, profile.output_dir))
+    for key, profile in old_profiles.items():
+        if key not in new_keys:
+            profile.remove()
+    for profile in new_profiles:
+        key = (profile.name, profile.output_dir)
+        if key in old_profiles:
+            profile.names = old_profiles[key].names
+        else:
+            add_profile_outputs(profile)
 
+    settings, profiles = new_settings, new_profiles
+    # render everything with new templates
+    widgets.reset()
+    logging.info('Settings file reloaded')
 
 def on_session_change():
-    if ir['DriverInfo']:
-        state.my_car_idx = ir['DriverInfo']['DriverCarIdx']
-        state.rpm_min = ir['DriverInfo']['DriverCarSLFirstRPM'] * 2/3
-        state.rpm_max = ir['DriverInfo']['DriverCarRedLine']
+    if tick['DriverInfo']:
+        state.my_car_idx = tick['DriverInfo']['DriverCarIdx']
+        state.rpm_min = tick['DriverInfo']['DriverCarSLFirstRPM'] * 2/3
+        state.rpm_max = tick['DriverInfo']['DriverCarRedLine']
     else:
         state.my_car_idx = state.rpm_min = state.rpm_max = -1
 
-    if ir['WeekendInfo']:
-        state.track_length = float(ir['WeekendInfo']['TrackLength'].split()[0])
+    if tick['WeekendInfo']:
+        state.track_length = float(tick['WeekendInfo']['TrackLength'].split()[0])
     else:
         state.track_length = -1
 
-    if ir['SessionInfo']:
-        state.session_laps = ir['SessionInfo']['Sessions'][state.last_session_num]['SessionLaps']
-        session_time = ir['SessionInfo']['Sessions'][state.last_session_num]['SessionTime']
+    if tick['SessionInfo']:
+        state.session_laps = tick['SessionInfo']['Sessions'][state.last_session_num]['SessionLaps']
+        session_time = tick['SessionInfo']['Sessions'][state.last_session_num]['SessionTime']
         state.session_time = -1 if session_time == 'unlimited' else float(session_time.split()[0])
-        state.cur_session_type = ir['SessionInfo']['Sessions'][state.last_session_num]['SessionType']
+        state.cur_session_type = tick['SessionInfo']['Sessions'][state.last_session_num]['SessionType']
     else:
         state.session_laps = state.session_time = -1
         state.cur_session_type = None
 
-    if ir['WeekendInfo'] and ir['DriverInfo']:
-        state.event_type = ir['WeekendInfo']['EventType']
+    if tick['WeekendInfo'] and tick['DriverInfo']:
+        state.event_type = tick['WeekendInfo']['EventType']
         if state.twitch:
-            track_name = ir['WeekendInfo']['TrackDisplayName']
-            driver = next(d for d in ir['DriverInfo']['Drivers'] if d['CarIdx'] == state.my_car_idx)
+            track_name = tick['WeekendInfo']['TrackDisplayName']
+            driver = next(d for d in tick['DriverInfo']['Drivers'] if d['CarIdx'] == state.my_car_idx)
             car_class_name = driver['CarClassShortName'] if driver['CarClassShortName'] else driver['CarPath']
-            state.twitch.status = settings['twitch']['status_tmpl'].format(state.event_type, car_class_name, track_name)
+            state.twitch.status = profiles[0].tmpl.status(state.event_type, car_class_name, track_name)
     else:
         state.event_type = None
         if state.twitch:
             state.twitch.status = None
 
-    if ir['SplitTimeInfo']:
-        state.first_sector_pct = ir['SplitTimeInfo']['Sectors'][1]['SectorStartPct']
+    if tick['SplitTimeInfo']:
+        state.first_sector_pct = tick['SplitTimeInfo']['Sectors'][1]['SectorStartPct']
     else:
         state.first_sector_pct = -1
 
     state.drivers = {}
-    state.last_time_update_drivers = -1
+    standing_index.reset()
+    lap_history.reset()
+    fuel_estimator.reset()
+    session_info.invalidate()
+    speeds.reset()
+    if gaps:
+        gaps.reset()
+    widgets.reset('drivers')
     on_cam_change()
 
 def on_cam_change():
-    state.last_time_update_lap_ses_time = -1
-    state.last_time_update_positions = -1
-    state.last_time_update_standing = -1
-    state.cur_dist_pct = 0
-    state.last_dist_pct = 0
-    state.speed_calc_data = []
+    widgets.reset('lap_ses_time', 'position', 'standing')
+
+def format_rpm(tmpl, rpm):
+    vert_line = tmpl.vertical_line
+    blocks = tmpl.blocks
+    return vert_line + (
+            blocks[-1] * math.ceil(rpm * state.rpm_len - 1) +
+            blocks[round(rpm % (1 / state.rpm_len) * state.rpm_len * (len(blocks) - 1))]
+        ).ljust(state.rpm_len) + vert_line
 
 def update_speed_rpm():
-    if ir['CarIdxTrackSurface'][state.cam_car_idx] == irsdk.TrkLoc.NOT_IN_WORLD \
-        or (ir['IsReplayPlaying'] and ir['ReplayFrameNumEnd'] > 10):
+    if tick['CarIdxTrackSurface'][state.cam_car_idx] == irsdk.TrkLoc.NOT_IN_WORLD \
+        or (tick['IsReplayPlaying'] and tick['ReplayFrameNumEnd'] > 10):
 
-        if f_speed_rpm.tell() > 0:
-            f_speed_rpm.truncate(0)
+        for profile in profiles:
+            profile.clear('speed_rpm')
+        if shared:
+            shared.set_car(0, 0, -1)
         return
 
     if state.my_car_idx == state.cam_car_idx:
-        speed = ir['Speed']
-        rpm = ir['RPM']
-        gear = ir['Gear']
-        fuel = ir['FuelLevel']
+        speed = tick['Speed']
+        rpm = tick['RPM']
+        gear = tick['Gear']
+        fuel = tick['FuelLevel']
     else:
         speed = None
-        rpm = ir['CarIdxRPM'][state.cam_car_idx]
-        gear = ir['CarIdxGear'][state.cam_car_idx]
+        rpm = tick['CarIdxRPM'][state.cam_car_idx]
+        gear = tick['CarIdxGear'][state.cam_car_idx]
         fuel = None
 
     if not rpm is None:
@@ -148,59 +397,67 @@ def update_speed_rpm():
         else:
             rpm = low * rpm / state.rpm_min
         rpm = max(0, min(rpm, 1))
-        vert_line = settings['speed_rpm']['vertical_line']
-        blocks = settings['speed_rpm']['blocks']
-        rpm = vert_line + (
-                blocks[-1] * math.ceil(rpm * state.rpm_len - 1) +
-                blocks[round(rpm % (1 / state.rpm_len) * state.rpm_len * (len(blocks) - 1))]
-            ).ljust(state.rpm_len) + vert_line
+
+    if speed is None:
+        speed = speeds.speed(state.cam_car_idx, state.track_length)
+
+    if not fuel is None:
+        fuel_stats = format_fuel_stats(fuel)
+
+    if shared:
+        shared.set_car(speed, gear, rpm)
 
     if not gear is None:
         gear = 'R' if gear == -1 else 'N' if gear == 0 else gear
 
-    if speed is None:
-        speed = 0
-        if len(state.speed_calc_data) > 1:
-            diff_pct = state.speed_calc_data[-1][0] - state.speed_calc_data[0][0]
-            if diff_pct < 0: diff_pct += 1
-            diff_time = max(0, state.speed_calc_data[-1][1] - state.speed_calc_data[0][1])
-            if diff_pct > 0 and diff_time > 0:
-                speed = max(0, state.track_length * diff_pct / diff_time * 1000)
-                if speed > 110:
-                    speed = 0
     speed = speed * 3.6
 
-    fuel = '' if fuel is None else settings['speed_rpm']['fuel_tmpl'].format(fuel, fuel * 0.264172052)
-
-    result = settings['speed_rpm']['speed_rpm_tmpl'].format(speed, speed * 0.621371192, rpm, gear, fuel)
-    logging.debug(result)
-    f_speed_rpm.seek(0)
-    f_speed_rpm.write(result)
-    f_speed_rpm.truncate(f_speed_rpm.tell())
+    for profile in profiles:
+        tmpl = profile.tmpl
+        rpm_str = None if rpm is None else format_rpm(tmpl, rpm)
+        fuel_str = '' if fuel is None else tmpl.fuel(fuel, fuel * 0.264172052, *fuel_stats)
+        result = tmpl.speed_rpm(speed, speed * 0.621371192, rpm_str, gear, fuel_str)
+        logging.debug(result)
+        profile.write('speed_rpm', result)
+
+def format_fuel_stats(fuel):
+    # fuel per lap, laps remaining with current fuel and fuel to add to finish session
+    time_left = -1
+    if state.session_time != -1:
+        elapsed = state.cur_session_time
+        if state.race_start_time != -1:
+            elapsed -= state.race_start_time
+        time_left = max(0, state.session_time - elapsed)
+    session_laps = state.session_laps if type(state.session_laps) is int else -1
+    laps_to_go = fuel_estimator.laps_to_go(tick['Lap'], tick['LapDistPct'], session_laps, time_left)
+
+    per_lap = fuel_estimator.per_lap()
+    laps_remaining = fuel_estimator.laps_remaining(fuel)
+    fuel_to_finish = fuel_estimator.fuel_to_finish(fuel, laps_to_go)
+    return (
+        templates.format_fuel(per_lap) if per_lap != -1 else '',
+        templates.format_fuel_laps(laps_remaining) if laps_remaining != -1 else '',
+        templates.format_fuel(fuel_to_finish) if fuel_to_finish != -1 else '')
 
 def update_lap_ses_time():
-    if state.last_time_update_lap_ses_time > 0 and state.cur_session_time - state.last_time_update_lap_ses_time < .5:
-        return
-    state.last_time_update_lap_ses_time = state.cur_session_time
-
     session_type = state.cur_session_type or 'Session Time'
     session_time = state.cur_session_time or 0
 
     # detect race start time
     if state.race_start_time == -1 and state.cur_session_type == 'Race':
-        flags = ir['SessionFlags']
+        flags = tick['SessionFlags']
         if flags & irsdk.Flags.START_GO:
             state.race_start_time = session_time
-        elif flags & irsdk.Flags.START_HIDDEN and ir['SessionState'] >= irsdk.SessionState.RACING:
+        elif flags & irsdk.Flags.START_HIDDEN and tick['SessionState'] >= irsdk.SessionState.RACING:
             state.race_start_time = 0
 
     if state.race_start_time != -1:
         session_time -= state.race_start_time
 
     if state.my_car_idx == state.cam_car_idx:
-        lap =  ir['Lap']
+        lap =  tick['Lap']
     else:
-        lap =  ir['CarIdxLap'][state.cam_car_idx]
+        lap =  tick['CarIdxLap'][state.cam_car_idx]
 
     if not session_time is None:
         m, s = divmod(int(session_time), 60)
@@ -216,7 +473,7 @@ def update_lap_ses_time():
                 session_time += '{:02}m'.format(m) if h else '{}m'.format(m)
 
     if not lap is None and not state.session_laps is None:
-        if lap < 1 or (ir['IsReplayPlaying'] and ir['ReplayFrameNumEnd'] > 10):
+        if lap < 1 or (tick['IsReplayPlaying'] and tick['ReplayFrameNumEnd'] > 10):
             lap = ''
         elif type(state.session_laps) is int and state.session_laps > 0:
             lap = 'Lap: {}/{}'.format(lap, state.session_laps)
@@ -225,426 +482,487 @@ def update_lap_ses_time():
 
     result = '{}  {}: {}'.format(lap, session_type, session_time)
     logging.debug(result)
-    f_lap_ses_time.seek(0)
-    f_lap_ses_time.write(result)
-    f_lap_ses_time.truncate(f_lap_ses_time.tell())
+    for profile in profiles:
+        profile.write('lap_ses_time', result)
 
 def update_drivers():
-    if state.last_time_update_drivers > 0 and state.cur_session_time - state.last_time_update_drivers < 1:
+    diff = session_info.take_diff()
+    if not diff:
         return
-    state.last_time_update_drivers = state.cur_session_time
 
-    if ir['DriverInfo']:
-        for d in ir['DriverInfo']['Drivers']:
+    added = set()
+    if tick['DriverInfo']:
+        for d in tick['DriverInfo']['Drivers']:
             if d['IsSpectator'] or d['UserID'] == -1: continue
             car_idx = d['CarIdx']
+            if not diff.full and not car_idx in diff.drivers: continue
             if not car_idx in state.drivers:
-                state.drivers[car_idx] = dict(
-                    license_class = LICENSE_CLASSES[int(max(0, (d['LicLevel'] - 1)) / 4)],
-                    safety_rating = '{:.2f}'.format(d['LicSubLevel'] / 100),
-                    class_position = 0)
-            state.drivers[car_idx]['driver_info'] = d
-
-    if ir['SessionInfo']:
-        results_positions = ir['SessionInfo']['Sessions'][state.last_session_num]['ResultsPositions']
+                state.drivers[car_idx] = Driver(car_idx)
+                added.add(car_idx)
+            state.drivers[car_idx].set_driver_info(d)
+
+    if tick['SessionInfo']:
+        results_positions = tick['SessionInfo']['Sessions'][state.last_session_num]['ResultsPositions']
         if results_positions:
             for pos in results_positions:
                 car_idx = pos['CarIdx']
+                if not diff.full and not car_idx in diff.results and not car_idx in added: continue
                 if car_idx in state.drivers:
-                    state.drivers[car_idx]['position_info'] = pos
-                    state.drivers[car_idx]['class_position'] = pos['ClassPosition'] + 1
-
-    if ir['QualifyResultsInfo']:
-        qual_positions = ir['QualifyResultsInfo']['Results']
+                    driver = state.drivers[car_idx]
+                    had_position_info = driver.has_position_info
+                    laps_complete = driver.laps_complete
+                    driver.set_position_info(pos)
+                    # new completed lap, first seen position info could have old lap
+                    if had_position_info and driver.laps_complete > laps_complete:
+                        lap_history.add(car_idx, driver.last_time)
+
+    if tick['QualifyResultsInfo']:
+        qual_positions = tick['QualifyResultsInfo']['Results']
         if qual_positions:
             for pos in qual_positions:
                 car_idx = pos['CarIdx']
+                if not diff.full and not car_idx in diff.qual and not car_idx in added: continue
                 if car_idx in state.drivers:
-                    state.drivers[car_idx]['qual_info'] = pos
-
-
-def sort_by_lap_distance(diff):
-    if diff < -.5:
-        return diff + 1
-    elif diff > .5:
-        return diff - 1
-    return diff
+                    state.drivers[car_idx].set_qual_info(pos)
+
+    standing_index.update(state.drivers, None if diff.full else diff.drivers | diff.results | diff.qual | added)
+
+def format_lap_stats(car_idx):
+    # last laps average, best lap, consistency and current stint laps, average and deviation
+    average = lap_history.average(car_idx)
+    best = lap_history.best[car_idx]
+    consistency = lap_history.consistency(car_idx)
+    stint_laps, stint_average, stint_deviation = lap_history.stint(car_idx)
+    return (
+        templates.format_lap_time(average) if average != -1 else '',
+        templates.format_lap_time(best) if best != -1 else '',
+        templates.format_consistency(consistency) if consistency != -1 else '',
+        stint_laps,
+        templates.format_lap_time(stint_average) if stint_average != -1 else '',
+        templates.format_consistency(stint_deviation) if stint_deviation != -1 else '')
+
+def format_position(tmpl, driver, arrow, is_cur_session_race):
+    lap_time = ''
+    if driver.has_position_info:
+        last_time = driver.last_time
+        if is_cur_session_race:
+            if last_time != -1:
+                lap_time = templates.format_lap_time(last_time)
+        else:
+            fastest_time = driver.fastest_time
+            if driver.lap_distance < state.first_sector_pct and last_time != -1:
+                lap_time = templates.format_last_lap_time(last_time)
+            elif fastest_time != -1:
+                lap_time = templates.format_lap_time(fastest_time)
+
+    return tmpl.position(
+        lap_time,
+        arrow,
+        templates.format_class_position(driver.class_position) if driver.class_position > 0 else '',
+        driver.car_number,
+        driver.license_class,
+        driver.safety_rating,
+        driver.irating,
+        driver.user_name,
+        *format_lap_stats(driver.car_idx))
 
 def update_position():
-    if state.last_time_update_positions > 0 and state.cur_session_time - state.last_time_update_positions < 1:
-        return
-    state.last_time_update_positions = state.cur_session_time
-
-    position = []
-
-    if state.cam_car_idx in state.drivers and ir['CarIdxTrackSurface'][state.cam_car_idx] != -1:
-        for car_idx, (lap, pct) in enumerate(zip(ir['CarIdxLap'], ir['CarIdxLapDistPct'])):
-            if not car_idx in state.drivers: continue
-            d = state.drivers[car_idx]
-            d['overall_distance'] = lap + pct
-            d['lap_distance'] = pct
+    positions = [[] for _ in profiles]
+
+    cars_by_position, cur_pos = [], -1
+    if state.cam_car_idx in state.drivers and tick['CarIdxTrackSurface'][state.cam_car_idx] != -1:
+        lap_dist_pcts = tick['CarIdxLapDistPct']
+        cars_by_position, cur_pos = relative.relative_order(lap_dist_pcts, tick['CarIdxTrackSurface'],
+            state.cam_car_idx, state.drivers)
+    if shared:
+        shared.set_neighbours(cars_by_position, cur_pos)
+
+    if cur_pos != -1:
+        # only next, current and previous cars are shown
+        drivers_by_position = [None] * len(cars_by_position)
+        for i in range(max(0, cur_pos - 1), min(cur_pos + 2, len(cars_by_position))):
+            car_idx = cars_by_position[i]
+            drivers_by_position[i] = state.drivers[car_idx]
+            drivers_by_position[i].lap_distance = lap_dist_pcts[car_idx]
 
         is_cur_session_race = state.cur_session_type == 'Race'
-        cur_car_lap_dist = state.drivers[state.cam_car_idx]['lap_distance']
 
-        drivers_by_position = sorted([d for d in state.drivers.values() if d['lap_distance'] != -1],
-            reverse=True, key=lambda x: sort_by_lap_distance(x['lap_distance'] - cur_car_lap_dist))
+        for profile, position in zip(profiles, positions):
+            tmpl = profile.tmpl
 
-        # filter by class
-        # cur_car_class_id = state.drivers[state.cam_car_idx]['driver_info']['CarClassID']
-        # drivers_by_position = [d for d in drivers_by_position if d['driver_info']['CarClassID'] == cur_car_class_id]
+            # next
+            if cur_pos == 0:
+                position.append('LEADER'.rjust(24) if state.drivers[state.cam_car_idx].class_position == 1 else '')
+            else:
+                position.append(format_position(tmpl, drivers_by_position[cur_pos - 1], tmpl.up_arrow, is_cur_session_race))
 
-        cur_pos = drivers_by_position.index(state.drivers[state.cam_car_idx])
-        pos_format = settings['position']['position_tmpl']
+            # me
+            position.append(format_position(tmpl, drivers_by_position[cur_pos], tmpl.square, is_cur_session_race))
 
-        # next
-        if cur_pos == 0:
-            position.append('LEADER'.rjust(24) if state.drivers[state.cam_car_idx]['class_position'] == 1 else '')
-        else:
-            driver = drivers_by_position[cur_pos - 1]
-            diff_time = ''
-            if 'position_info' in driver:
-                last_time = driver['position_info']['LastTime']
-                if is_cur_session_race:
-                    if last_time != -1:
-                        diff_time = '{:.0f}:{:06.3f}'.format(*divmod(last_time, 60))
-                else:
-                    fastest_time = driver['position_info']['FastestTime']
-                    if driver['lap_distance'] < state.first_sector_pct and last_time != -1:
-                        diff_time = 'Last {:.0f}:{:06.3f}'.format(*divmod(last_time, 60))
-                    elif fastest_time != -1:
-                        diff_time = '{:.0f}:{:06.3f}'.format(*divmod(fastest_time, 60))
-            position.append(pos_format.format(
-                diff_time,
-                settings['position']['up_arrow'],
-                'P{0[class_position]:2}'.format(driver) if driver['class_position'] > 0 else '',
-                driver['driver_info']['CarNumber'],
-                driver['license_class'],
-                driver['safety_rating'],
-                driver['driver_info']['IRating'],
-                driver['driver_info']['UserName']))
-
-        # me
-        driver = drivers_by_position[cur_pos]
-        lap_time = ''
-        if 'position_info' in driver:
-            last_time = driver['position_info']['LastTime']
-            if is_cur_session_race:
-                if last_time != -1:
-                    lap_time = '{:.0f}:{:06.3f}'.format(*divmod(last_time, 60))
+            # prev
+            if cur_pos == len(drivers_by_position) - 1 or not drivers_by_position[cur_pos + 1].has_position_info:
+                position.append('')
             else:
-                fastest_time = driver['position_info']['FastestTime']
-                if cur_car_lap_dist < state.first_sector_pct and last_time != -1:
-                    lap_time = 'Last {:.0f}:{:06.3f}'.format(*divmod(last_time, 60))
-                elif fastest_time != -1:
-                    lap_time = '{:.0f}:{:06.3f}'.format(*divmod(fastest_time, 60))
-
-        position.append(pos_format.format(
-                lap_time,
-                settings['position']['square'],
-                'P{0[class_position]:2}'.format(driver) if driver['class_position'] > 0 else '',
-                driver['driver_info']['CarNumber'],
-                driver['license_class'],
-                driver['safety_rating'],
-                driver['driver_info']['IRating'],
-                driver['driver_info']['UserName']))
-
-        # prev
-        if cur_pos == len(drivers_by_position) - 1 or not 'position_info' in drivers_by_position[cur_pos + 1]:
-            position.append('')
-        else:
-            driver = drivers_by_position[cur_pos + 1]
-            diff_time = ''
-            if 'position_info' in driver:
-                last_time = driver['position_info']['LastTime']
-                if is_cur_session_race:
-                    if last_time != -1:
-                        diff_time = '{:.0f}:{:06.3f}'.format(*divmod(last_time, 60))
-                else:
-                    fastest_time = driver['position_info']['FastestTime']
-                    if driver['lap_distance'] < state.first_sector_pct and last_time != -1:
-                        diff_time = 'Last {:.0f}:{:06.3f}'.format(*divmod(last_time, 60))
-                    elif fastest_time != -1:
-                        diff_time = '{:.0f}:{:06.3f}'.format(*divmod(fastest_time, 60))
-            position.append(pos_format.format(
-                diff_time,
-                settings['position']['down_arrow'],
-                'P{0[class_position]:2}'.format(driver) if driver['class_position'] > 0 else '',
-                driver['driver_info']['CarNumber'],
-                driver['license_class'],
-                driver['safety_rating'],
-                driver['driver_info']['IRating'],
-                driver['driver_info']['UserName']))
-
-    result = '\n'.join(position)
-    logging.debug('\n%s', result)
-    f_position.seek(0)
-    f_position.write(result)
-    f_position.truncate(f_position.tell())
+                position.append(format_position(tmpl, drivers_by_position[cur_pos + 1], tmpl.down_arrow, is_cur_session_race))
 
+    for profile, position in zip(profiles, positions):
+        result = '\n'.join(position)
+        logging.debug('\n%s', result)
+        profile.write('position', result)
 
-def update_standing():
-    if state.last_time_update_standing > 0 and state.cur_session_time - state.last_time_update_standing < 1:
-        return
-    state.last_time_update_standing = state.cur_session_time
 
+def standing_rows(drivers_by_position, use_pos_info, is_cur_session_race, overall=False):
     standing = []
-
-    is_cur_session_race = state.cur_session_type == 'Race' and ir['SessionState'] >= irsdk.SessionState.RACING
-    is_cur_session_qual = 'Qualify' in state.cur_session_type
-    use_pos_info = is_cur_session_race or is_cur_session_qual or not ir['QualifyResultsInfo']
-
-    if state.cam_car_idx in state.drivers:
-        cur_car_class_id = state.drivers[state.cam_car_idx]['driver_info']['CarClassID']
-        drivers_by_position = [d for d in state.drivers.values() if d['driver_info']['CarClassID'] == cur_car_class_id]
-    else:
-        drivers_by_position = state.drivers.values()
-
-    if use_pos_info:
-        drivers_by_position = [d for d in drivers_by_position if 'position_info' in d]
-        drivers_by_position = sorted(drivers_by_position, key=lambda x: x['class_position'])
-    else:
-        drivers_by_position = [d for d in drivers_by_position if 'qual_info' in d]
-        drivers_by_position = sorted(drivers_by_position, key=lambda x: x['qual_info']['Position'])
+    with_lap_stats = any(profile.tmpl.standing_extra for profile in profiles)
 
     for i, driver in enumerate(drivers_by_position):
         diff_time = ''
         if use_pos_info:
-            driver_pos_info = driver['position_info']
             if is_cur_session_race:
-                leader_pos_info = drivers_by_position[0]['position_info']
-                leader_last_lap_time = leader_pos_info['LastTime']
+                leader = drivers_by_position[0]
+                leader_last_lap_time = leader.last_time
 
-                car_idx = driver['position_info']['CarIdx']
-                is_in_pit = ir['CarIdxOnPitRoad'][car_idx]
-                laps_complete = driver_pos_info['LapsComplete']
+                is_in_pit = tick['CarIdxOnPitRoad'][driver.car_idx]
+                laps_complete = driver.laps_complete
 
                 if i == 0:
-                    diff_time = '{:>5} {:>5}'.format('LAP', 'PIT' if is_in_pit else laps_complete)
+                    diff_time = templates.format_standing_diff('LAP', 'PIT' if is_in_pit else laps_complete)
                 else:
-                    prev_driver_pos_info = drivers_by_position[i - 1]['position_info']
-                    diff_laps = leader_pos_info['LapsComplete'] - laps_complete
-                    diff_laps_rel = prev_driver_pos_info['LapsComplete'] - laps_complete
+                    prev_driver = drivers_by_position[i - 1]
+                    diff_laps = leader.laps_complete - laps_complete
+                    diff_laps_rel = prev_driver.laps_complete - laps_complete
 
-                    gap = driver_pos_info['Time'] - leader_pos_info['Time']
-                    gap_str = ''
+                    # live gap from checkpoint times, falls back to session info times when more than lap behind
+                    live_gap = gaps.gap(driver.car_idx, leader.car_idx) if gaps else None
+                    gap = driver.time - leader.time
+                    gap_str = templates.format_gap(live_gap) if live_gap is not None else ''
 
-                    if gap >= 0 and laps_complete:
+                    if not gap_str and gap >= 0 and laps_complete:
                         if diff_laps <= 0 or \
                             (diff_laps == 1 and (leader_last_lap_time == -1 or gap < leader_last_lap_time)):
-                            gap_str = '{:.1f}'.format(gap)
-                        elif ir['SessionState'] < irsdk.SessionState.CHECKERED and \
+                            gap_str = templates.format_gap(gap)
+                        elif tick['SessionState'] < irsdk.SessionState.CHECKERED and \
                             diff_laps > 0 and leader_last_lap_time != -1 and \
                             math.ceil(gap / leader_last_lap_time) == diff_laps:
-                            gap_str = '{:4}L'.format(diff_laps - 1)
+                            gap_str = templates.format_gap_laps(diff_laps - 1)
                         elif diff_laps > 0:
-                            gap_str = '{:4}L'.format(diff_laps)
+                            gap_str = templates.format_gap_laps(diff_laps)
 
                     if not gap_str and diff_laps > 1:
-                        gap_str = '{:4}L'.format(diff_laps)
+                        gap_str = templates.format_gap_laps(diff_laps)
 
-                    inter = driver_pos_info['Time'] - prev_driver_pos_info['Time']
+                    live_inter = gaps.gap(driver.car_idx, prev_driver.car_idx) if gaps else None
+                    inter = driver.time - prev_driver.time
                     inter_str = ''
 
                     if is_in_pit:
                         inter_str = 'PIT'
+                    elif live_inter is not None:
+                        inter_str = templates.format_gap(live_inter)
                     elif inter >= 0 and laps_complete:
                         if diff_laps_rel <= 0 or \
                             (diff_laps_rel == 1 and (leader_last_lap_time == -1 or inter < leader_last_lap_time)):
-                            inter_str = '{:.1f}'.format(inter)
-                        elif ir['SessionState'] < irsdk.SessionState.CHECKERED and \
+                            inter_str = templates.format_gap(inter)
+                        elif tick['SessionState'] < irsdk.SessionState.CHECKERED and \
                             diff_laps_rel > 0 and leader_last_lap_time != -1 and \
                             math.ceil(inter / leader_last_lap_time) == diff_laps_rel:
-                            inter_str = '{:4}L'.format(diff_laps_rel - 1)
+                            inter_str = templates.format_gap_laps(diff_laps_rel - 1)
                         elif diff_laps_rel > 0:
-                            inter_str = '{:4}L'.format(diff_laps_rel)
+                            inter_str = templates.format_gap_laps(diff_laps_rel)
 
                     if not inter_str and diff_laps_rel > 1:
-                        inter_str = '{:4}L'.format(diff_laps_rel)
+                        inter_str = templates.format_gap_laps(diff_laps_rel)
 
-                    diff_time = '{:>5} {:>5}'.format(gap_str, inter_str)
+                    diff_time = templates.format_standing_diff(gap_str, inter_str)
             else:
-                fastest_time = driver_pos_info['FastestTime']
+                fastest_time = driver.fastest_time
                 if fastest_time != -1:
-                    diff_time = '{:.0f}:{:06.3f}'.format(*divmod(fastest_time, 60))
+                    diff_time = templates.format_lap_time(fastest_time)
         else:
-            fastest_time = driver['qual_info']['FastestTime']
+            fastest_time = driver.qual_fastest_time
             if fastest_time > 0:
-                diff_time = '{:.0f}:{:06.3f}'.format(*divmod(fastest_time, 60))
+                diff_time = templates.format_lap_time(fastest_time)
 
         standing.append((driver, diff_time))
 
-    if len(standing):
-        max_abbrev_len = max(len(driver['driver_info']['AbbrevName']) for driver, _ in standing) - 3 # 3 = last ', X'
-
-        if is_cur_session_race:
-            standing_header = '{:>4} {:>3} {} {:>5} {:>5}'.format('Pos', '#', ' ' * max_abbrev_len, 'Gap', 'Int')
-        else:
-            standing_header = '{:>4} {:>3} {} {:>8}'.format('Pos', '#', ' ' * max_abbrev_len, 'Lap Time')
-
-        standing_fmt = '{0:1}{1:3} {2[driver_info][CarNumber]:>3} {3:%d} {4}' % max_abbrev_len
-        cur_driver_index = -1
-        for i, (driver, diff_time) in enumerate(standing):
-            r_arr = ''
-            if driver['driver_info']['CarIdx'] == state.cam_car_idx:
-                r_arr = settings['standing']['right_arrow']
-                cur_driver_index = i
-            pos = driver['class_position'] if use_pos_info else driver['qual_info']['Position'] + 1
-            driver_name = driver['driver_info']['AbbrevName'].rsplit(',', 1)[0]
-            standing[i] = standing_fmt.format(r_arr, pos, driver, driver_name, diff_time)
-
-        max_standing = settings['standing']['max']
-        window = settings['standing']['window']
-        if len(standing) <= max_standing:
-            pass
-        elif cur_driver_index == -1 or cur_driver_index < max_standing - int(window / 2):
-            standing = standing[:max_standing]
+    rows = []
+    cur_driver_index = -1
+    for i, (driver, diff_time) in enumerate(standing):
+        if driver.car_idx == state.cam_car_idx:
+            cur_driver_index = i
+        if use_pos_info:
+            pos = driver.position if overall else driver.class_position
         else:
-            standing = standing[:max_standing - 1 - window + max(0, int(window / 2) + cur_driver_index + 1 - len(standing))] + \
-                [settings['standing']['horizontal_bar'] * len(standing_header)] + \
-                standing[cur_driver_index - int(window / 2) : cur_driver_index + math.ceil(window / 2)]
+            pos = driver.qual_position + 1
+        rows.append((pos, driver.car_number, driver.abbrev_name.rsplit(',', 1)[0], diff_time,
+            format_lap_stats(driver.car_idx) if with_lap_stats else None))
+    max_abbrev_len = max(len(driver.abbrev_name) for driver, _ in standing) - 3 if standing else 0 # 3 = last ', X'
+
+    return standing, rows, cur_driver_index, max_abbrev_len
+
+def write_standing(name, rows, cur_driver_index, max_abbrev_len, is_cur_session_race, class_output=False):
+    for profile in profiles:
+        if class_output:
+            if not profile.tmpl.standing_classes:
+                continue
+            if name not in profile.names:
+                profile.add(name)
+        result = format_standing(profile.tmpl, rows, cur_driver_index, max_abbrev_len, is_cur_session_race)
+        logging.debug('\n%s', result)
+        profile.write(name, result)
+
+def class_output_names():
+    # class short names could give same file name, such classes get class id suffix
+    names = {class_id: re.sub(r'\W+', '_', class_name).strip('_').lower() or str(class_id)
+        for class_id, class_name in standing_index.class_names.items()}
+    used = list(names.values())
+    return {class_id: 'standing_class_' + (name if used.count(name) == 1 else '{}_{}'.format(name, class_id))
+        for class_id, name in names.items()}
 
-        result = standing_header + '\n' + '\n'.join(standing)
+def update_standing():
+    is_cur_session_race = state.cur_session_type == 'Race' and tick['SessionState'] >= irsdk.SessionState.RACING
+    is_cur_session_qual = 'Qualify' in state.cur_session_type
+    use_pos_info = is_cur_session_race or is_cur_session_qual or not tick['QualifyResultsInfo']
+
+    cam_driver = state.drivers.get(state.cam_car_idx)
+    cam_class_id = cam_driver.car_class_id if cam_driver else None
+
+    # multiclass session, every class and overall (None) get own output, cam car class is also written to standing
+    multiclass = len(standing_index.classes) > 1 and any(profile.tmpl.standing_classes for profile in profiles)
+    class_outputs = set()
+    output_names = class_output_names() if multiclass else {}
+    for class_id in list(standing_index.classes) + [None] if multiclass else [cam_class_id]:
+        drivers_by_position = standing_index.ordered(class_id, use_pos_info)
+        standing, rows, cur_driver_index, max_abbrev_len = standing_rows(drivers_by_position, use_pos_info,
+            is_cur_session_race, overall=class_id is None)
+
+        if class_id == cam_class_id:
+            if shared:
+                shared.set_rows([(pos, driver.car_idx, car_number, name, diff_time)
+                    for (driver, _), (pos, car_number, name, diff_time, _) in zip(standing, rows)])
+            write_standing('standing', rows, cur_driver_index, max_abbrev_len, is_cur_session_race)
+
+        if multiclass:
+            name = 'standing_overall' if class_id is None else output_names[class_id]
+            class_outputs.add(name)
+            write_standing(name, rows, cur_driver_index, max_abbrev_len, is_cur_session_race, True)
+
+    # classes, which are not in session anymore
+    for profile in profiles:
+        profile.clear(*(state.class_outputs - class_outputs))
+    state.class_outputs = class_outputs
+
+def format_standing(tmpl, rows, cur_driver_index, max_abbrev_len, is_cur_session_race):
+    if not rows:
+        return ''
+
+    standing_header = tmpl.standing_header(max_abbrev_len, is_cur_session_race)
+    standing_row = tmpl.standing_row(max_abbrev_len)
+    standing_extra = tmpl.standing_extra
+    standing = [standing_row(tmpl.right_arrow if i == cur_driver_index else '', *row[:4]) +
+        (standing_extra(*row[4]) if standing_extra else '') for i, row in enumerate(rows)]
+
+    max_standing = tmpl.standing_max
+    window = tmpl.standing_window
+    if len(standing) <= max_standing:
+        pass
+    elif cur_driver_index == -1 or cur_driver_index < max_standing - int(window / 2):
+        standing = standing[:max_standing]
     else:
-        result = ''
+        standing = standing[:max_standing - 1 - window + max(0, int(window / 2) + cur_driver_index + 1 - len(standing))] + \
+            [tmpl.horizontal_bar * len(standing_header)] + \
+            standing[cur_driver_index - int(window / 2) : cur_driver_index + math.ceil(window / 2)]
 
-    logging.debug('\n%s', result)
-    f_standing.seek(0)
-    f_standing.write(result)
-    f_standing.truncate(f_standing.tell())
+    return standing_header + '\n' + '\n'.join(standing)
 
 
 def update_twitch():
     tw_state = state.twitch
+    client = tw_state.client
 
     # update twitch status
-    if tw_state.oauth_token and tw_state.status and tw_state.status != tw_state.last_status:
-        if not tw_state.twreq_status:
-            logging.info('updating twitch status...')
-            tw_state.twreq_status = twitch.TwitchAPIRequest(twitch.TWITCH_API_CHANNELS % tw_state.channel.lower(), 'PUT',
-                {'channel[status]': tw_state.status}, oauth_token=tw_state.oauth_token)
-        if not tw_state.twreq_status.is_alive():
-            if tw_state.twreq_status.error:
-                logging.warn('twitch status error: %s', tw_state.twreq_status.error)
-            elif tw_state.twreq_status.result:
-                logging.info('twitch status updated to "%s"', tw_state.twreq_status.result['status'])
-                tw_state.last_status = tw_state.status
-            tw_state.twreq_status = None
+    if tw_state.oauth_token and tw_state.status and tw_state.status != tw_state.last_status \
+        and tw_state.status != tw_state.pending_status:
+        logging.info('updating twitch status...')
+        client.set_status(tw_state.status)
+        tw_state.pending_status = tw_state.status
 
     # update viewers and followers
     data_changed = False
 
-    if tw_state.pending:
-        logging.debug('twitch pending')
-        tw_state.pending = (tw_state.twreq_stream and tw_state.twreq_stream.is_alive()) or \
-            (tw_state.twreq_follows and tw_state.twreq_follows.is_alive())
-        if not tw_state.pending:
+    for kind, result, error in client.results():
+        if kind == 'status':
+            if error:
+                logging.warn('twitch status error: %s', error)
+            elif result:
+                logging.info('twitch status updated to "%s"', result['status'])
+                tw_state.last_status = tw_state.pending_status
+                # viewers could come soon after status change
+                tw_state.poll_interval.reset()
+            tw_state.pending_status = None
+        elif kind == 'poll':
+            stream, follows = result
+            last_values = tw_state.last_viewers, tw_state.last_followers, tw_state.last_follower
+            if error:
+                logging.warn('twitch poll error: %s', error)
+            if stream:
+                tw_state.last_viewers = stream['stream']['viewers'] if stream['stream'] else 0
+            if follows:
+                tw_state.last_followers = follows['_total']
+                if follows['follows']:
+                    tw_state.last_follower = follows['follows'][0]['user']['display_name']
+            if not error:
+                changed = last_values != (tw_state.last_viewers, tw_state.last_followers, tw_state.last_follower)
+                interval = tw_state.poll_interval.update(changed, bool(stream['stream']))
+                logging.debug('twitch next poll in %.0fs', interval)
+            tw_state.pending = False
             tw_state.last_update = time.time()
             data_changed = True
 
-        if tw_state.twreq_stream and not tw_state.twreq_stream.is_alive():
-            if tw_state.twreq_stream.error:
-                logging.warn('twitch stream error: %s', tw_state.twreq_stream.error)
-            elif tw_state.twreq_stream.result:
-                if tw_state.twreq_stream.result['stream']:
-                    tw_state.last_viewers = tw_state.twreq_stream.result['stream']['viewers']
-                else:
-                    tw_state.last_viewers = 0
-            tw_state.twreq_stream = None
-
-        if tw_state.twreq_follows and not tw_state.twreq_follows.is_alive():
-            if tw_state.twreq_follows.error:
-                logging.warn('twitch follows error: %s', tw_state.twreq_follows.error)
-            elif tw_state.twreq_follows.result:
-                tw_state.last_followers = tw_state.twreq_follows.result['_total']
-                if tw_state.twreq_follows.result['follows']:
-                    tw_state.last_follower = tw_state.twreq_follows.result['follows'][0]['user']['display_name']
-            tw_state.twreq_follows = None
-
-    if not tw_state.pending and time.time() - tw_state.last_update > 10:
+    if tw_state.pending:
+        logging.debug('twitch pending')
+    elif time.time() - tw_state.last_update > tw_state.poll_interval.interval:
         logging.debug('twitch start requests')
-        tw_state.twreq_stream = twitch.TwitchAPIRequest(twitch.TWITCH_API_STREAMS % tw_state.channel.lower())
-        tw_state.twreq_follows = twitch.TwitchAPIRequest(twitch.TWITCH_API_CHANNELS_FOLLOWS % tw_state.channel.lower(), data=dict(limit=1))
+        client.poll()
         tw_state.pending = True
 
     if data_changed:
-        result = settings['twitch']['lates_follower_tmpl'].format(tw_state.last_follower) if tw_state.last_follower else ''
-        logging.debug(result)
-        f_twitch_last_follower.seek(0)
-        f_twitch_last_follower.write(result)
-        f_twitch_last_follower.truncate(f_twitch_last_follower.tell())
+        for profile in profiles:
+            tmpl = profile.tmpl
+            result = tmpl.latest_follower(tw_state.last_follower) if tw_state.last_follower else ''
+            logging.debug(result)
+            profile.write('twitch_last_follower', result)
 
-        result = settings['twitch']['viewers_followers_tmpl'].format(tw_state.last_viewers, tw_state.last_followers)
-        logging.debug(result)
-        f_twitch_viewers_followers.seek(0)
-        f_twitch_viewers_followers.write(result)
-        f_twitch_viewers_followers.truncate(f_twitch_viewers_followers.tell())
+            result = tmpl.viewers_followers(tw_state.last_viewers, tw_state.last_followers)
+            logging.debug(result)
+            profile.write('twitch_viewers_followers', result)
 
 
 
+def parent_alive():
+    # main renderer keeps frame ring heartbeat, other renderers exit when it stops
+    if frame_ring:
+        frame_ring.parent_heartbeat()
+    elif args.source and not ir.ring.is_parent_alive():
+        logging.info('Main process is gone, exiting')
+        return False
+    return True
+
 def main():
-    global state
+    global state, tick, first_frame
+
+    if stats:
+        start = time.perf_counter()
+
+    if settings_watcher and settings_watcher.changed():
+        reload_settings()
 
     if state.twitch:
         update_twitch()
+        if stats:
+            stats.since('twitch', start)
 
     if state.is_connected and (not ir.is_initialized or not ir.is_connected):
         state.is_connected = False
         ir.shutdown()
-        for f in [f_speed_rpm, f_lap_ses_time, f_position, f_standing]:
-            f.truncate(0)
+        for profile in profiles:
+            profile.clear(*TELEMETRY_OUTPUTS + tuple(state.class_outputs))
         logging.info('IRSDK disconnected')
         tw_state = state.twitch
         state = State()
-        if tw_state and 'status_default' in settings['twitch']:
-            tw_state.status = settings['twitch']['status_default']
+        session_info.reset()
+        speeds.reset()
+        if gaps:
+            gaps.reset()
+        standing_index.reset()
+        lap_history.reset()
+        fuel_estimator.reset()
+        widgets.reset()
+        if shared:
+            shared.reset()
+            shared.commit(0, -1)
+        if tw_state and profiles[0].tmpl.status_default:
+            tw_state.status = profiles[0].tmpl.status_default
         state.twitch = tw_state
     elif not state.is_connected and (ir.is_initialized or ir.is_connected or ir.startup()):
         state.is_connected = True
         logging.info('IRSDK connected')
 
     if not state.is_connected:
-        time.sleep(2)
+        time.sleep(state.reconnect_delay)
+        state.reconnect_delay = min(reconnect_max, state.reconnect_delay * 2)
         return
 
-    state.cur_session_time = ir['SessionTime']
-
-    # session changed
-    if state.last_session_num != ir['SessionNum'] or \
-        state.last_session_state != ir['SessionState'] or \
-        state.rpm_min == -1 or state.rpm_max == -1 or \
-        state.track_length == -1 or \
-        state.first_sector_pct == -1 or \
-        not state.cur_session_type or \
-        (state.twitch and not state.twitch.status):
-
-        state.last_session_num = ir['SessionNum']
-        state.last_session_state = ir['SessionState']
+    tick = telemetry.Snapshot(ir, session_info)
+    try:
+        process_tick()
+    finally:
+        tick.release()
+
+    if first_frame:
+        first_frame = False
+        logging.info('First frame %.3f s after start', time.perf_counter() - START_TIME)
+    if stats:
+        stats.tick_done(start)
+
+def process_tick():
+    if stats:
+        stage_start = time.perf_counter()
+
+    state.cur_session_time = tick['SessionTime']
+    session_info_changed = session_info.refresh(tick['SessionNum']) is not None
+    if stats:
+        stage_start = stats.since('session_info', stage_start)
+
+    # session changed, missing session data could only show up with new session info
+    if state.last_session_num != tick['SessionNum'] or \
+        state.last_session_state != tick['SessionState'] or \
+        session_info_changed and (
+            state.rpm_min == -1 or state.rpm_max == -1 or \
+            state.track_length == -1 or \
+            state.first_sector_pct == -1 or \
+            not state.cur_session_type or \
+            (state.twitch and not state.twitch.status)):
+
+        state.last_session_num = tick['SessionNum']
+        state.last_session_state = tick['SessionState']
         try:
             on_session_change()
         except:
             state.last_session_num = -1
             logging.exception('error in on session change')
+        if stats:
+            stage_start = stats.since('session_change', stage_start)
 
     # cam changed
-    if state.cam_car_idx != ir['CamCarIdx']:
-        state.cam_car_idx = ir['CamCarIdx']
+    if state.cam_car_idx != tick['CamCarIdx']:
+        state.cam_car_idx = tick['CamCarIdx']
         try:
             on_cam_change()
         except:
             state.cam_car_idx = -1
             logging.exception('error in on cam change')
+        if stats:
+            stage_start = stats.since('cam_change', stage_start)
 
-    state.last_dist_pct = state.cur_dist_pct
-    state.cur_dist_pct = ir['CarIdxLapDistPct'][state.cam_car_idx]
-    state.speed_calc_data.append((state.cur_dist_pct, state.cur_session_time))
-    state.speed_calc_data = state.speed_calc_data[-10:]
+    speeds.update(tick['CarIdxLapDistPct'], state.cur_session_time)
+    if gaps:
+        gaps.update(tick['CarIdxLap'], tick['CarIdxLapDistPct'], state.cur_session_time)
+    if tick['CarIdxOnPitRoad']:
+        lap_history.mark_pits(tick['CarIdxOnPitRoad'])
+    fuel_estimator.update(tick['Lap'], tick['FuelLevel'], tick['OnPitRoad'], state.cur_session_time)
 
-    update_speed_rpm()
-    update_lap_ses_time()
-    update_drivers()
-    update_position()
-    update_standing()
+    widgets.run(state.cur_session_time)
+
+    if shared:
+        shared.commit(state.cur_session_time, state.cam_car_idx)
+
+    if record:
+        if stats:
+            stage_start = time.perf_counter()
+        record.record(tick, session_info.values if session_info_changed else None)
+        if stats:
+            stats.since('record', stage_start)
 
 
 if __name__ == '__main__':
@@ -655,9 +973,26 @@ if __name__ == '__main__':
     parser.add_argument('-V', '--version', action='version', version='iRacing Text Overlay %s' % VERSION, help='show version and exit')
     parser.add_argument('--test', help='use test file as irsdk mmap')
     parser.add_argument('--dump', help='dump irsdk mmap to file')
+    parser.add_argument('--replay', help='replay recording, directory or zip archive of irsdk mmap dumps and show benchmark')
+    parser.add_argument('--record', help='record telemetry of every tick to file')
+    parser.add_argument('--record-all', help='record all telemetry variables, not only used by overlay', action='store_true')
+    parser.add_argument('--stats', help='collect timing stats, periodically write them to log, or to file if specified',
+        nargs='?', const='', default=None)
+    parser.add_argument('--replay-speed', help='replay speed, 1 - recorded speed, 0 - as fast as possible', type=float, default=0)
+    parser.add_argument('--sampler', help=argparse.SUPPRESS)
+    parser.add_argument('--source', help=argparse.SUPPRESS)
+    parser.add_argument('--renderer', help=argparse.SUPPRESS, default='0/1')
     args = parser.parse_args()
 
-    logging_handlers = [logging.handlers.RotatingFileHandler('log', maxBytes=1024**2, backupCount=1, encoding='utf-8')]
+    renderer_index, renderer_count = map(int, args.renderer.split('/'))
+
+    # every process of multiprocess mode has its own log
+    log_name = 'log'
+    if args.sampler:
+        log_name = 'log.sampler'
+    elif renderer_index:
+        log_name = 'log.renderer%d' % renderer_index
+    logging_handlers = [logging.handlers.RotatingFileHandler(log_name, maxBytes=1024**2, backupCount=1, encoding='utf-8')]
     if not args.silent:
         logging_handlers.append(logging.StreamHandler())
 
@@ -668,7 +1003,7 @@ if __name__ == '__main__':
 
     settings = None
     try:
-        settings = json.loads(re.sub(r'^\s*\/\/.*', '', open('settings.json', 'r', encoding='utf-8').read(), flags=re.M))
+        settings = load_settings()
     except FileNotFoundError:
         shutil.copy('settings.tmpl', 'settings.json')
         logging.info('Settings file created')
@@ -680,34 +1015,163 @@ if __name__ == '__main__':
         logging.fatal('No settings file')
         sys.exit(0)
 
-    ir = irsdk.IRSDK()
-    ir.startup(test_file=args.test, dump_to=args.dump)
+    if args.sampler:
+        import sampler
+        loop_settings = settings.get('loop', {})
+        sampler.run(args.sampler, loop_settings.get('max_rate', 60), loop_settings.get('reconnect_max', RECONNECT_MAX))
+        sys.exit(0)
+
+    # multiprocess mode, sampler process reads telemetry into frame ring, renderers read it from there
+    process_settings = settings.get('processes', {})
+    multiprocess = not args.source and process_settings.get('enabled', False) and \
+        not args.test and not args.dump and not args.replay
+    if multiprocess:
+        renderer_count = max(1, process_settings.get('renderers', 1))
+
+    try:
+        profiles = load_profiles(settings)
+        schedule = load_schedule(settings)
+    except templates.TemplateError as e:
+        logging.fatal('Settings template error: %s', e)
+        sys.exit(1)
+
+    frame_ring = None
+    children = []
+    if multiprocess:
+        import sampler
+        args.source = 'ir-text-overlay-frames-%d' % os.getpid()
+        frame_ring = sampler.FrameRing(args.source, create=True)
+        children.append(sampler.spawn(['-s', '--sampler', args.source]))
+        for i in range(1, renderer_count):
+            children.append(sampler.spawn(['-s', '-nt', '--source', args.source,
+                '--renderer', '{}/{}'.format(i, renderer_count)]))
+        logging.info('Multiprocess mode, %d renderers', renderer_count)
+
+    if args.replay or args.record:
+        import recorder
+    if args.source:
+        import sampler
+        ir = sampler.SharedSource(args.source)
+    elif args.replay and recorder.is_recording(args.replay):
+        ir = recorder.RecordingReader(args.replay)
+    else:
+        ir = irsdk.IRSDK()
+    if not args.replay:
+        ir.startup(test_file=args.test, dump_to=args.dump)
 
     if args.dump:
         sys.exit(0)
 
-    f_speed_rpm = open('speed_rpm.txt', 'w', encoding='utf-8')
-    f_lap_ses_time = open('lap_ses_time.txt', 'w', encoding='utf-8')
-    f_position = open('position.txt', 'w', encoding='utf-8')
-    f_standing = open('standing.txt', 'w', encoding='utf-8')
+    output_settings = settings.get('output', {})
+    out = output.OutputSink(write_files=output_settings.get('files', True),
+        background=output_settings.get('background', True))
 
     state = State()
-
-    if not args.test and not args.no_twitch and settings['twitch']['channel']:
+    first_frame = True
+    reconnect_max = settings.get('loop', {}).get('reconnect_max', RECONNECT_MAX)
+    session_info = telemetry.SessionInfoCache(ir)
+    speeds = car_speed.SpeedTracker()
+    standing_index = standings.StandingIndex()
+    lap_history = laps.LapHistory(window=settings.get('laps', {}).get('window', 5))
+    fuel_estimator = car_fuel.FuelEstimator(window=settings.get('fuel', {}).get('window', 5))
+    gap_checkpoints = settings.get('gaps', {}).get('checkpoints', 100)
+    gaps = car_gaps.GapTracker(gap_checkpoints) if gap_checkpoints else None
+
+    record = None
+    if args.record:
+        record = recorder.Recorder(args.record, ir.var_headers_names if args.record_all else None)
+
+    widgets = scheduler.Scheduler()
+    for name in DEFAULT_SCHEDULE:
+        widgets.add(name, globals()['update_' + name])
+    configure_widgets(schedule)
+
+    shared = None
+    shared_settings = settings.get('shared_memory', {})
+    if shared_settings.get('enabled', False) and not renderer_index:
+        import shm
+        shared = shm.SharedState(shared_settings.get('name', shm.DEFAULT_NAME))
+
+    stats = None
+    if args.stats is not None:
+        loop_settings = settings.get('loop', {})
+        if loop_settings.get('mode', 'sync') == 'sync':
+            tick_interval = 1 / min(60, loop_settings.get('max_rate', 60) or 60)
+        else:
+            tick_interval = 1 / loop_settings.get('rate', 25)
+        import stats as statistics
+        stats = statistics.Stats(out, tick_interval, settings.get('stats', {}).get('interval', 60), args.stats or None)
+        widgets.stats = stats
+        stats.scheduler = widgets
+        stats.shared = shared
+
+    overlay_server = None
+    server_settings = settings.get('server', {})
+    if server_settings.get('enabled', False) and not renderer_index:
+        import server
+        overlay_server = server.OverlayServer(server_settings.get('host', '127.0.0.1'), server_settings.get('port', 8182))
+        overlay_server.start()
+        out.listeners.append(overlay_server.publish)
+
+    if not args.test and not args.replay and not args.no_twitch and not renderer_index and settings['twitch']['channel']:
+        import twitch
         state.twitch = TwitchState()
         state.twitch.channel = settings['twitch']['channel']
         state.twitch.oauth_token = settings['twitch']['access_token']
-        f_twitch_last_follower = open('twitch_last_follower.txt', 'w', encoding='utf-8')
-        f_twitch_viewers_followers = open('twitch_viewers_followers.txt', 'w', encoding='utf-8')
+        state.twitch.client = twitch.TwitchClient(state.twitch.channel, state.twitch.oauth_token,
+            settings['twitch'].get('api_base', twitch.TWITCH_API_BASE), settings['twitch'].get('timeout', 10))
+        state.twitch.poll_interval = twitch.AdaptiveInterval(settings['twitch'].get('poll_min', 10),
+            settings['twitch'].get('poll_max', 120), settings['twitch'].get('poll_backoff', 1.5))
+        if stats:
+            stats.twitch = state.twitch.client
+
+    for profile in profiles:
+        add_profile_outputs(profile)
+
+    # settings are reloaded when file changes, only in live mode
+    settings_watcher = None
+    if not args.test and not args.replay:
+        settings_watcher = SettingsWatcher('settings.json')
 
     try:
         if args.test or args.dump:
             main()
+        elif args.replay:
+            import replay
+            replay.run(ir, main, widgets, out, args.replay, args.replay_speed)
         else:
-            while True:
-                main()
-                time.sleep(1/25)
+            loop_settings = settings.get('loop', {})
+            if loop_settings.get('mode', 'sync') == 'sync':
+                waiter = telemetry.TickWaiter(ir, loop_settings.get('max_rate', 60))
+                while parent_alive():
+                    # wait for next telemetry tick, time out to keep twitch and connection checks going
+                    if state.is_connected:
+                        waiter.wait()
+                    main()
+            else:
+                while parent_alive():
+                    main()
+                    time.sleep(1 / loop_settings.get('rate', 25))
     except KeyboardInterrupt:
         pass
     except:
         logging.exception('')
+
+    out.close()
+    out.log_counts()
+    if overlay_server:
+        overlay_server.stop()
+    if state.twitch:
+        state.twitch.client.stop()
+    if stats:
+        stats.report()
+    if record:
+        record.close()
+    if shared:
+        shared.close()
+    for child in children:
+        child.terminate()
+    for child in children:
+        child.wait()
+    if frame_ring:
+        frame_ring.remove()
@@ -0,0 +1,171 @@
+#!python3
+
+import sys
+import time
+
+SESSION_INFO_KEYS = ('DriverInfo', 'SessionInfo', 'WeekendInfo', 'QualifyResultsInfo', 'SplitTimeInfo')
+
+DATA_VALID_EVENT_NAME = 'Local\\IRSDKDataValidEvent'
+SYNCHRONIZE = 0x00100000
+
+class TickWaiter:
+    def __init__(self, ir, max_rate=60, poll_interval=1/120):
+        self.ir = ir
+        self.min_interval = 1 / max_rate if max_rate > 0 else 0
+        self.poll_interval = poll_interval
+        self.last_tick = -1
+        self.last_time = 0
+        self._event = None
+
+    def tick_count(self):
+        # shared source counts frames from sampler process
+        if hasattr(self.ir, 'tick_count'):
+            return self.ir.tick_count()
+        header = getattr(self.ir, '_header', None)
+        if not header or not header.var_buf:
+            return -1
+        return max(buf.tick_count for buf in header.var_buf)
+
+    def _open_event(self):
+        if self._event is None and sys.platform == 'win32':
+            import ctypes
+            self._event = ctypes.windll.kernel32.OpenEventW(SYNCHRONIZE, False, DATA_VALID_EVENT_NAME) or None
+        return self._event
+
+    def _sleep(self, timeout, use_event):
+        event = self._open_event() if use_event else None
+        if event:
+            import ctypes
+            ctypes.windll.kernel32.WaitForSingleObject(event, max(1, int(timeout * 1000)))
+        else:
+            time.sleep(min(timeout, self.poll_interval))
+
+    def wait(self, timeout=.5):
+        # limit render rate
+        delay = self.last_time + self.min_interval - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+        deadline = time.perf_counter() + timeout
+        use_event = True
+        while True:
+            tick = self.tick_count()
+            now = time.perf_counter()
+            if tick != self.last_tick:
+                self.last_tick = tick
+                self.last_time = now
+                return True
+            if now >= deadline:
+                return False
+            # event may stay signaled without new tick, poll in that case
+            self._sleep(deadline - now, use_event)
+            use_event = False
+
+class Snapshot:
+    def __init__(self, ir, session_info=None):
+        self.ir = ir
+        self.session_info = session_info
+        self.values = {}
+        # freeze latest var buffer, so every widget sees same frame
+        self.frozen = hasattr(ir, 'freeze_var_buffer_latest')
+        if self.frozen:
+            ir.freeze_var_buffer_latest()
+
+    def __getitem__(self, key):
+        try:
+            return self.values[key]
+        except KeyError:
+            if self.session_info and key in SESSION_INFO_KEYS:
+                value = self.session_info[key]
+            else:
+                value = self.ir[key]
+            self.values[key] = value
+            return value
+
+    def release(self):
+        if self.frozen:
+            self.ir.unfreeze_var_buffer_latest()
+            self.frozen = False
+
+class SessionInfoDiff:
+    def __init__(self, full=False):
+        # full - everything should be treated as changed
+        self.full = full
+        self.drivers = set()
+        self.drivers_removed = set()
+        self.results = set()
+        self.qual = set()
+
+    def __bool__(self):
+        return bool(self.full or self.drivers or self.drivers_removed or self.results or self.qual)
+
+    def merge(self, other):
+        self.full = self.full or other.full
+        self.drivers |= other.drivers
+        self.drivers_removed |= other.drivers_removed
+        self.results |= other.results
+        self.qual |= other.qual
+
+def _diff_by_car_idx(old, new):
+    changed = {car_idx for car_idx, item in new.items() if old.get(car_idx) != item}
+    return changed, old.keys() - new.keys()
+
+class SessionInfoCache:
+    def __init__(self, ir):
+        self.ir = ir
+        self.reset()
+
+    def reset(self):
+        self.update = None
+        self.session_num = -1
+        self.values = {}
+        self.pending = SessionInfoDiff(full=True)
+        self._drivers = {}
+        self._results = {}
+        self._qual = {}
+
+    def _session_info_update(self):
+        # recording reader has its own counter
+        if hasattr(self.ir, 'session_info_update'):
+            return self.ir.session_info_update
+        header = getattr(self.ir, '_header', None)
+        return getattr(header, 'session_info_update', None)
+
+    def refresh(self, session_num):
+        # returns diff if session info was changed, None otherwise
+        update = self._session_info_update()
+        if update is not None and update == self.update and session_num == self.session_num:
+            return None
+        self.update = update
+        self.session_num = session_num
+        self.values = {key: self.ir[key] for key in SESSION_INFO_KEYS}
+
+        driver_info = self.values['DriverInfo']
+        drivers = {d['CarIdx']: d for d in driver_info['Drivers']} if driver_info else {}
+
+        results = {}
+        session_info = self.values['SessionInfo']
+        if session_info and 0 <= session_num < len(session_info['Sessions']):
+            results = {pos['CarIdx']: pos for pos in session_info['Sessions'][session_num]['ResultsPositions'] or []}
+
+        qual_info = self.values['QualifyResultsInfo']
+        qual = {pos['CarIdx']: pos for pos in qual_info['Results'] or []} if qual_info else {}
+
+        diff = SessionInfoDiff()
+        diff.drivers, diff.drivers_removed = _diff_by_car_idx(self._drivers, drivers)
+        diff.results, _ = _diff_by_car_idx(self._results, results)
+        diff.qual, _ = _diff_by_car_idx(self._qual, qual)
+        self._drivers, self._results, self._qual = drivers, results, qual
+
+        self.pending.merge(diff)
+        return diff
+
+    def invalidate(self):
+        self.pending.full = True
+
+    def take_diff(self):
+        diff, self.pending = self.pending, SessionInfoDiff()
+        return diff
+
+    def __getitem__(self, key):
+        return self.values.get(key)
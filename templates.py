@@ -0,0 +1,119 @@
+#!python3
+
+# sample values, every template is checked against each set of them at load time
+SPEED_RPM_SAMPLES = [(0.0, 0.0, '', 'N', ''), (250.5, 155.6, '|####  |', 3, '  Fuel: 1.000l')]
+FUEL_SAMPLES = [(10.5, 2.77, '', '', ''), (10.5, 2.77, '2.45', '4.3', '12.30')]
+POSITION_SAMPLES = [('', '', '', '1', 'R', '0.00', 0, '', '', '', '', 0, '', ''),
+    ('Last 1:23.456', '>', 'P 1', '99', 'WC', '4.99', 9999, 'Name', '1:23.456', '1:23.000', '0.25', 12, '1:23.789', '0.40')]
+STANDING_EXTRA_SAMPLES = [('', '', '', 0, '', ''), ('1:23.456', '1:23.000', '0.25', 12, '1:23.789', '0.40')]
+STATUS_SAMPLES = [('Race', 'GT3', 'Suzuka')]
+VIEWERS_FOLLOWERS_SAMPLES = [(0, 0)]
+LATEST_FOLLOWER_SAMPLES = [('follower',)]
+
+format_class_position = 'P{:2}'.format
+format_lap_time_parts = '{:.0f}:{:06.3f}'.format
+format_last_lap_time_parts = 'Last {:.0f}:{:06.3f}'.format
+format_standing_diff = '{:>5} {:>5}'.format
+format_gap = '{:.1f}'.format
+format_gap_laps = '{:4}L'.format
+format_consistency = '{:.2f}'.format
+format_fuel = '{:.2f}'.format
+format_fuel_laps = '{:.1f}'.format
+
+def format_lap_time(lap_time):
+    return format_lap_time_parts(*divmod(lap_time, 60))
+
+def format_last_lap_time(lap_time):
+    return format_last_lap_time_parts(*divmod(lap_time, 60))
+
+class TemplateError(Exception):
+    pass
+
+PROFILE_SECTIONS = ('speed_rpm', 'position', 'standing', 'twitch')
+
+def profile_settings(settings, profile):
+    # profile sections override same keys of main settings
+    merged = dict(settings)
+    for section in PROFILE_SECTIONS:
+        if section in profile:
+            if not isinstance(profile[section], dict) or not isinstance(settings.get(section, {}), dict):
+                raise TemplateError('{}: should be object'.format(section))
+            merged[section] = dict(settings[section] if section in settings else {}, **profile[section])
+    return merged
+
+def compile_template(name, tmpl, samples):
+    if not isinstance(tmpl, str):
+        raise TemplateError('{}: template should be a string'.format(name))
+    for sample in samples:
+        try:
+            tmpl.format(*sample)
+        except (IndexError, KeyError, ValueError, TypeError, AttributeError) as e:
+            raise TemplateError('{}: {!r} {}: {}'.format(name, tmpl, type(e).__name__, e))
+    return tmpl.format
+
+def _get(settings, section, key, kind=str, default=None):
+    try:
+        value = settings[section][key]
+    except (KeyError, TypeError):
+        if default is not None:
+            return default
+        raise TemplateError('{}.{}: missing'.format(section, key))
+    if not isinstance(value, kind):
+        raise TemplateError('{}.{}: should be {}'.format(section, key, kind.__name__))
+    return value
+
+class Templates:
+    def __init__(self, settings):
+        self.speed_rpm = compile_template('speed_rpm.speed_rpm_tmpl',
+            _get(settings, 'speed_rpm', 'speed_rpm_tmpl'), SPEED_RPM_SAMPLES)
+        self.fuel = compile_template('speed_rpm.fuel_tmpl',
+            _get(settings, 'speed_rpm', 'fuel_tmpl'), FUEL_SAMPLES)
+        self.vertical_line = _get(settings, 'speed_rpm', 'vertical_line')
+        self.blocks = _get(settings, 'speed_rpm', 'blocks', list)
+        if len(self.blocks) < 2 or not all(isinstance(b, str) for b in self.blocks):
+            raise TemplateError('speed_rpm.blocks: should be list of at least 2 strings')
+
+        self.position = compile_template('position.position_tmpl',
+            _get(settings, 'position', 'position_tmpl'), POSITION_SAMPLES)
+        self.up_arrow = _get(settings, 'position', 'up_arrow')
+        self.square = _get(settings, 'position', 'square')
+        self.down_arrow = _get(settings, 'position', 'down_arrow')
+
+        self.standing_max = _get(settings, 'standing', 'max', int)
+        self.standing_window = _get(settings, 'standing', 'window', int)
+        self.right_arrow = _get(settings, 'standing', 'right_arrow')
+        self.horizontal_bar = _get(settings, 'standing', 'horizontal_bar')
+        self.standing_classes = _get(settings, 'standing', 'classes', bool, default=True)
+        standing_extra = _get(settings, 'standing', 'extra_tmpl', default='')
+        self.standing_extra = compile_template('standing.extra_tmpl', standing_extra,
+            STANDING_EXTRA_SAMPLES) if standing_extra else None
+        self._standing_row_formats = {}
+        self._standing_headers = {}
+
+        self.status = compile_template('twitch.status_tmpl',
+            _get(settings, 'twitch', 'status_tmpl'), STATUS_SAMPLES)
+        self.status_default = _get(settings, 'twitch', 'status_default', default='') or None
+        self.viewers_followers = compile_template('twitch.viewers_followers_tmpl',
+            _get(settings, 'twitch', 'viewers_followers_tmpl'), VIEWERS_FOLLOWERS_SAMPLES)
+        self.latest_follower = compile_template('twitch.lates_follower_tmpl',
+            _get(settings, 'twitch', 'lates_follower_tmpl'), LATEST_FOLLOWER_SAMPLES)
+
+    def standing_row(self, name_width):
+        # row format depends only on longest name, so cache it per width
+        try:
+            return self._standing_row_formats[name_width]
+        except KeyError:
+            fmt = self._standing_row_formats[name_width] = ('{0:1}{1:3} {2:>3} {3:%d} {4}' % name_width).format
+            return fmt
+
+    def standing_header(self, name_width, is_race):
+        key = name_width, is_race
+        try:
+            return self._standing_headers[key]
+        except KeyError:
+            if is_race:
+                header = '{:>4} {:>3} {} {:>5} {:>5}'.format('Pos', '#', ' ' * name_width, 'Gap', 'Int')
+            else:
+                header = '{:>4} {:>3} {} {:>8}'.format('Pos', '#', ' ' * name_width, 'Lap Time')
+            self._standing_headers[key] = header
+            return header
@@ -1,48 +1,197 @@
 #!python3
 
-import threading
 import json
-from urllib import parse, request
+import time
+import threading
+import collections
+import http.client
+from urllib import parse
 
-TWITCH_API_CHANNELS = 'https://api.twitch.tv/kraken/channels/%s'
+TWITCH_API_BASE = 'https://api.twitch.tv/kraken'
+TWITCH_API_CHANNELS = '/channels/%s'
 TWITCH_API_CHANNELS_FOLLOWS = TWITCH_API_CHANNELS + '/follows'
-TWITCH_API_STREAMS = 'https://api.twitch.tv/kraken/streams/%s'
+TWITCH_API_STREAMS = '/streams/%s'
 
-class TwitchAPIRequest(threading.Thread):
-    def __init__(self, url, method='GET', data=None, oauth_token=None, *args, **kwargs):
-        if data and method == 'GET':
-            url += '?' + parse.urlencode(data)
-        self.request = request.Request(url, method=method)
-        self.request.add_header('Accept', 'application/vnd.twitchtv.v3+json')
-        if oauth_token:
-            self.request.add_header('Authorization', 'OAuth ' + oauth_token)
-        if data and method != 'GET':
-            self.request.data = parse.urlencode(data).encode('utf-8')
-        self.result = None
-        self.error = None
-        super().__init__(*args, target=self.process, **kwargs)
-        self.start()
-
-    def run(self, *args, **kwargs):
+BACKOFF_MIN = 2
+BACKOFF_MAX = 300
+
+class TwitchAPIError(Exception):
+    pass
+
+class AdaptiveInterval:
+    # poll fast after changes, slow down while values stay flat or stream is offline
+    def __init__(self, min_interval=10, max_interval=120, backoff=1.5):
+        self.min_interval = min_interval
+        self.max_interval = max(min_interval, max_interval)
+        self.backoff = backoff
+        self.interval = min_interval
+
+    def update(self, changed, online=True):
+        if changed:
+            self.interval = self.min_interval
+        elif not online:
+            self.interval = self.max_interval
+        else:
+            self.interval = min(self.max_interval, self.interval * self.backoff)
+        return self.interval
+
+    def reset(self):
+        self.interval = self.min_interval
+
+class TwitchClient:
+    # single long lived worker, reuses keep-alive connection for all requests
+    def __init__(self, channel, oauth_token=None, api_base=TWITCH_API_BASE, timeout=10):
+        self.channel = channel.lower()
+        self.oauth_token = oauth_token
+        url = parse.urlsplit(api_base)
+        self.connection_class = http.client.HTTPSConnection if url.scheme == 'https' else http.client.HTTPConnection
+        self.host = url.netloc
+        self.base_path = url.path.rstrip('/')
+        self.timeout = timeout
+        self.backoff = 0
+        self.requests = 0
+
+        self._conn = None
+        self._etags = {}
+        self._cond = threading.Condition()
+        self._poll_requested = False
+        self._status = None
+        self._stopped = False
+        self._results = collections.deque()
+
+        self.thread = threading.Thread(target=self._run, name='twitch', daemon=True)
+        self.thread.start()
+
+    def poll(self):
+        # streams and follows are requested together, repeated calls are coalesced
+        with self._cond:
+            self._poll_requested = True
+            self._cond.notify()
+
+    def set_status(self, status):
+        with self._cond:
+            self._status = status
+            self._cond.notify()
+
+    def results(self):
+        # list of (kind, result, error), kind is 'status' or 'poll'
+        results = []
+        while self._results:
+            results.append(self._results.popleft())
+        return results
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        self.thread.join(self.timeout)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._stopped or self._poll_requested or self._status is not None)
+                if self._stopped:
+                    break
+                status, self._status = self._status, None
+                poll, self._poll_requested = self._poll_requested, False
+
+            if status is not None:
+                result, error = self._call('PUT', TWITCH_API_CHANNELS % self.channel, {'channel[status]': status})
+                self._results.append(('status', result, error))
+
+            if poll:
+                stream, error = self._call('GET', TWITCH_API_STREAMS % self.channel)
+                follows = None
+                if not error:
+                    follows, error = self._call('GET', TWITCH_API_CHANNELS_FOLLOWS % self.channel, dict(limit=1))
+                self._results.append(('poll', (stream, follows), error))
+        self._close()
+
+    def _call(self, method, path, data=None):
+        if self.backoff:
+            with self._cond:
+                if self._cond.wait_for(lambda: self._stopped, self.backoff):
+                    return None, TwitchAPIError('stopped')
         try:
-            super().run(*args, **kwargs)
+            result = self._request(method, path, data)
         except Exception as e:
-            self.error = e
+            self.backoff = min(BACKOFF_MAX, max(BACKOFF_MIN, self.backoff * 2))
+            self._close()
+            return None, e
+        self.backoff = 0
+        return result, None
+
+    def _connection(self):
+        if self._conn is None:
+            self._conn = self.connection_class(self.host, timeout=self.timeout)
+        return self._conn
+
+    def _close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _request(self, method, path, data=None):
+        headers = {'Accept': 'application/vnd.twitchtv.v3+json'}
+        if self.oauth_token:
+            headers['Authorization'] = 'OAuth ' + self.oauth_token
+        body = None
+        if data and method == 'GET':
+            path += '?' + parse.urlencode(data)
+        elif data:
+            body = parse.urlencode(data).encode('utf-8')
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
 
-    def process(self):
-        result = json.loads(request.urlopen(self.request).read().decode('utf-8'))
+        # conditional request, server answers 304 if nothing changed
+        cached = self._etags.get(path) if method == 'GET' else None
+        if cached:
+            headers['If-None-Match'] = cached[0]
+
+        reused = self._conn is not None
+        try:
+            response, raw = self._send(method, path, body, headers)
+        except (http.client.HTTPException, ConnectionError):
+            # keep-alive connection could be closed by server, retry once on new one
+            self._close()
+            if not reused:
+                raise
+            response, raw = self._send(method, path, body, headers)
+        self.requests += 1
+
+        if response.getheader('Connection', '').lower() == 'close':
+            self._close()
+        if response.status == 304 and cached:
+            return cached[1]
+        if response.status >= 400:
+            raise TwitchAPIError('HTTP {} {}'.format(response.status, response.reason))
+
+        result = json.loads(raw.decode('utf-8'))
         if not result:
-            self.error = 'unknown error'
+            raise TwitchAPIError('unknown error')
         elif 'error' in result:
-            self.error = result['error']
-        else:
-            self.result = result
+            raise TwitchAPIError(result['error'])
+
+        etag = response.getheader('ETag')
+        if etag and method == 'GET':
+            self._etags[path] = (etag, result)
+        return result
+
+    def _send(self, method, path, body, headers):
+        conn = self._connection()
+        conn.request(method, self.base_path + path, body, headers)
+        response = conn.getresponse()
+        return response, response.read()
 
 if __name__ == '__main__':
-    channel = 'kutu182'
-    req = TwitchAPIRequest(TWITCH_API_STREAMS % channel)
-    # req = TwitchAPIRequest(TWITCH_API_CHANNELS_FOLLOWS % channel, data=dict(limit=1))
-    # req = TwitchAPIRequest(TWITCH_API_CHANNELS % channel, 'PUT', { 'channel[status]': 'test' })
-    req.join(5)
-    print(json.dumps(req.result, indent=2))
-    print(req.error)
+    client = TwitchClient('kutu182')
+    client.poll()
+    # client.set_status('test')
+    deadline = time.time() + 15
+    while time.time() < deadline:
+        results = client.results()
+        for kind, result, error in results:
+            print(kind, json.dumps(result, indent=2), error)
+        if results:
+            break
+        time.sleep(.1)
+    client.stop()